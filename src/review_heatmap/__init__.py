@@ -33,6 +33,8 @@
 Initializes add-on components.
 """
 
+import sys
+
 from ._version import __version__  # noqa: F401
 
 
@@ -77,4 +79,7 @@ def initialize_addon():
     initialize_finder()
 
 
-initialize_addon()
+# Anki imports aqt before loading add-ons. Anywhere else (e.g. when generating
+# reports headlessly, cf. headless.py) there is no add-on to set up.
+if "aqt" in sys.modules:
+    initialize_addon()
@@ -38,6 +38,7 @@ import time
 from enum import Enum
 from typing import (
     TYPE_CHECKING,
+    AbstractSet,
     Dict,
     List,
     Literal,
@@ -47,22 +48,24 @@ from typing import (
     Tuple,
 )
 
-from anki.utils import ids2str
-from anki.errors import NotFoundError
-
 if TYPE_CHECKING:
+    from anki.cards import Card
     from anki.collection import Collection
     from anki.dbproxy import DBProxy
 
+    from .libaddon.anki.configmanager import ConfigManager
+
+from .audit import auditor
+from .debug import isDebuggingOn, logger
+from .decks import DeckTreeIndex
+from .engine import MAX_FORECAST_DAYS, ActivitySnapshot, ChangeSignature, ReportEngine
 from .errors import CollectionError
-from .libaddon.anki.configmanager import ConfigManager
-from .libaddon.debug import isDebuggingOn, logger
-from .times import daystart_epoch
+from .instrumentation import instrumentation
+from .stats import ActivityStats
+from .store import ActivityStore
+from .times import daystart_epoch, local_daystart, local_tz_fingerprint
 from .types import DeckId
 
-# limit max forecast to 200 years to protect against invalid due dates
-MAX_FORECAST_DAYS = 73000
-
 
 class ActivityType(Enum):
     reviews = 0
@@ -108,14 +111,48 @@ class ActivityReport(NamedTuple):
     today: int
     offset: int
     stats: StatsReport
+    summary: Optional[ActivityStats] = None
+
+
+class TimeContext(NamedTuple):
+    """
+    Collection time settings and day boundaries, determined once per report
+
+    today: day timestamp of today
+    offset: day rollover offset in hours
+    sched_ver: scheduler version
+    rollover: rollover hour set for the v2+ schedulers, None on v1
+    creation_day: day timestamp of the collection's creation, None if unknown
+    """
+
+    today: int
+    offset: int
+    sched_ver: int
+    rollover: Optional[int]
+    creation_day: Optional[int]
+
+    def days_from_today(self, days: int) -> int:
+        return self.today + 86400 * days
 
 
 class ActivityReporter:
-    def __init__(self, col: "Collection", config: ConfigManager):
+    def __init__(
+        self,
+        col: "Collection",
+        config: "ConfigManager",
+        store: Optional[ActivityStore] = None,
+        verify_day_bucketing: bool = False,
+    ):
         self._col: "Collection"
         self._db: "DBProxy"
+        self._deck_index: DeckTreeIndex
 
-        self._config: ConfigManager = config
+        self._config: "ConfigManager" = config
+        # cross-check day starts against SQLite (always active in debug mode)
+        self._verify_day_bucketing: bool = verify_day_bucketing
+        self._engine: ReportEngine = ReportEngine(
+            col, store=store, verify_day_bucketing=verify_day_bucketing
+        )
         self.set_collection(col)
 
     # Public API
@@ -127,25 +164,44 @@ class ActivityReporter:
         limfcst: Optional[int] = None,
         activity_type: ActivityType = ActivityType.reviews,
         current_deck_only: bool = False,
+        deck_id: Optional[DeckId] = None,
+        signature: Optional[ChangeSignature] = None,
     ) -> Optional[ActivityReport]:
-
-        history_start, forecast_stop = self._get_time_limits(limhist, limfcst)
+        """
+        deck_id: deck to limit the report to if current_deck_only is set,
+                 defaults to the current deck
+        signature: change signature the caller took before requesting the
+                   report (e.g. to cache it under), probed if not set
+        """
+        time_context = self._time_context()
+        history_start, forecast_stop = self._get_time_limits(
+            time_context, limhist, limfcst
+        )
 
         if activity_type == ActivityType.reviews:
-            history = self._cards_done(
-                start=history_start,
-                current_deck_only=current_deck_only,
-            )
-            forecast = self._cards_due(
-                start=self._today,
-                stop=forecast_stop,
-                current_deck_only=current_deck_only,
+            snapshot = self._snapshot(
+                time_context, history_start=history_start, signature=signature
             )
+            with instrumentation.phase("slicing") as phase:
+                dids = self._report_decks(current_deck_only, deck_id)
+                history = self._cards_done(snapshot, dids, start=history_start)
+                forecast = self._cards_due(
+                    time_context,
+                    snapshot,
+                    dids,
+                    start=snapshot.today,
+                    stop=forecast_stop,
+                )
+                if phase:
+                    phase.rows = len(history) + len(forecast)
 
             if not history:
                 return None
 
-            activity_report = self._get_activity(history=history, forecast=forecast)
+            with instrumentation.phase("stats"):
+                activity_report = self._get_activity(
+                    time_context, history=history, forecast=forecast
+                )
         else:
             raise NotImplementedError(
                 "activity type {} not implemented".format(activity_type)
@@ -162,74 +218,120 @@ class ActivityReporter:
             raise CollectionError("Anki collection and/or database is not ready")
 
         self._col = col
-        self._db = col.db
+        self._db = auditor.wrap(col.db)
+        self._deck_index = DeckTreeIndex(col, self._db)
+        self._engine.set_collection(col)
 
-    # Activity calculations
-    #########################################################################
+    def patch_report(
+        self,
+        report: ActivityReport,
+        card: "Card",
+        limhist: Optional[int] = None,
+        limfcst: Optional[int] = None,
+        current_deck_only: bool = False,
+        previous_due: Optional[int] = None,
+    ) -> Optional[ActivityReport]:
+        """
+        Update a previously generated report after the given card has been
+        answered, without querying the review history or card schedules again
 
-    # General
+        previous_due: due day number of the card before it was answered, if it
+        was part of the forecast
 
-    def _get_activity(
-        self,
-        history: List[Sequence[int]],
-        forecast: Optional[List[Sequence[int]]] = None,
-    ) -> ActivityReport:
+        Returns None if the report cannot be patched (e.g. because the day
+        has rolled over in the meantime), in which case it needs to be
+        regenerated.
+        """
+        if card.odid:
+            # history is attributed to the home deck, but forecast and deck
+            # limits to the filtered deck the card is in
+            return None
 
-        first_day = history[0][0] if history else 0
-        last_day = forecast[-1][0] if forecast else 0
+        dids = self._report_decks(current_deck_only)
+        if dids is not None and card.did not in dids:
+            return report
 
-        # Stats: cumulative activity and streaks
+        time_context = self._time_context()
+        today = time_context.today
+        summary = report.summary
 
-        streak_max: int = 0
-        streak_cur: int = 0
-        streak_last: int = 0
-        current: int = 0
-        total: int = 0
-        idx: int = 0
-        next_timestamp: Optional[int]
+        if summary is None or report.today != today * 1000:
+            return None
+        if not summary.add_today(1):
+            return None
 
-        for idx, item in enumerate(history):
-            current += 1
-            timestamp, activity = item
+        activity = report.activity
+        activity[today] = summary.window(1).total
 
-            try:
-                next_timestamp = history[idx + 1][0]
-            except IndexError:  # last item
-                streak_last = current
-                next_timestamp = None
+        _, forecast_stop = self._get_time_limits(time_context, limhist, limfcst)
+        if forecast_stop is None:
+            forecast_stop = today + MAX_FORECAST_DAYS * 86400
 
-            if timestamp + 86400 != next_timestamp:  # >1 day gap. streak over.
-                if current > streak_max:
-                    streak_max = current
-                current = 0
+        forecast_changes = [(previous_due, -1)]
+        if card.queue in (2, 3):  # review, day learn
+            forecast_changes.append((card.due, 1))
 
-            total += activity
+        sched_today = self._col.sched.today
+        stop = report.stop
 
-        days_learned: int = idx + 1
-        today = self._today
+        for due, change in forecast_changes:
+            if due is None:
+                continue
+            due_day = today + (due - sched_today) * 86400
+            if not today < due_day < forecast_stop:
+                continue
+            # forecast counts are negative
+            count = activity.get(due_day, 0) - change
+            if count > 0 or (count == 0 and stop == due_day * 1000):
+                # out of sync or forecast range shrinking, regenerate instead
+                return None
+            elif count == 0:
+                activity.pop(due_day, None)
+            else:
+                activity[due_day] = count
+            if stop is None or due_day * 1000 > stop:
+                stop = due_day * 1000
 
-        # Stats: current streak
-        if history[-1][0] in (today, today - 86400):
-            # last recorded date today or yesterday?
-            streak_cur = streak_last
+        return report._replace(stop=stop, stats=self._get_stats_report(summary))
 
-        # Stats: average count on days with activity
-        avg_cur = int(round(total / max(days_learned, 1)))
+    def change_signature(self) -> ChangeSignature:
+        """
+        Cheap probe that changes whenever the reported activity might have
+        """
+        return self._engine.change_signature()
 
-        # Stats: percentage of days with activity
-        #
-        # NOTE: days_total is based on first recorded revlog entry, i.e. it is
-        # not the grand total of days since collection creation date / whatever
-        # history limits the user might have set. This value seems more
-        # desirable and motivating than the raw percentage of days learned
-        # in the date inclusion period.
+    def signature_after_review(
+        self,
+        previous: ChangeSignature,
+        card: "Card",
+        previous_did: DeckId,
+        previous_due: Optional[int] = None,
+    ) -> ChangeSignature:
+        """
+        Change signature after the given card has been answered, derived
+        from the one right before (cf. ReportEngine.signature_after_review)
+        """
+        return self._engine.signature_after_review(
+            previous, card, previous_did, previous_due
+        )
 
-        days_total = (today - first_day) / 86400 + 1
+    # Activity calculations
+    #########################################################################
 
-        if days_total == 1:
-            pdays = 100  # review history only extends to yesterday
-        else:
-            pdays = int(round((days_learned / days_total) * 100))
+    # General
+
+    def _get_activity(
+        self,
+        time_context: TimeContext,
+        history: List[Sequence[int]],
+        forecast: Optional[List[Sequence[int]]] = None,
+    ) -> ActivityReport:
+
+        first_day = history[0][0] if history else 0
+        last_day = forecast[-1][0] if forecast else 0
+        today = time_context.today
+
+        summary = ActivityStats(history, today)
 
         # Compose activity data
         activity_dict: Dict[int, int] = dict(history + forecast)  # type: ignore
@@ -243,13 +345,17 @@ class ActivityReporter:
             start=first_day * 1000 if first_day else None,
             stop=last_day * 1000 if last_day else None,
             today=today * 1000,
-            offset=self._offset,
-            stats=StatsReport(
-                streak_max=StatsEntryStreak(value=streak_max),
-                streak_cur=StatsEntryStreak(value=streak_cur),
-                pct_days_active=StatsEntryPercentage(value=pdays),
-                activity_daily_avg=StatsEntryCards(value=avg_cur),
-            ),
+            offset=time_context.offset,
+            stats=self._get_stats_report(summary),
+            summary=summary,
+        )
+
+    def _get_stats_report(self, summary: ActivityStats) -> StatsReport:
+        return StatsReport(
+            streak_max=StatsEntryStreak(value=summary.streak_max),
+            streak_cur=StatsEntryStreak(value=summary.streak_cur),
+            pct_days_active=StatsEntryPercentage(value=summary.pct_days_active),
+            activity_daily_avg=StatsEntryCards(value=summary.daily_avg),
         )
 
     # Collection properties
@@ -268,29 +374,57 @@ class ActivityReporter:
             return self._col.schedVer()
 
     @property
-    def _offset(self) -> int:
+    def _day_cutoff(self) -> int:
         """
-        Return daily scheduling cutoff time in hours
+        Return unix epoch timestamp in seconds at which the current day ends
         """
-        if self._sched_ver >= 2:
-            rollover = self._col.conf.get("rollover", 4)
-            return rollover
-
-        start_date = datetime.datetime.fromtimestamp(self._col.crt)
-        return start_date.hour
+        try:
+            return self._col.sched.day_cutoff
+        except AttributeError:
+            return self._col.sched.dayCutoff
 
-    @property
-    def _today(self) -> int:
+    def _time_context(self) -> TimeContext:
         """
-        Return unix epoch timestamp in seconds for today (00:00 UTC)
+        Snapshot of the collection's time settings. Each of them takes
+        attribute probes or local time conversions to determine, so they are
+        gathered once and passed on to everything involved in a report.
         """
-        return daystart_epoch(self._db, "now", is_timestamp=False, offset=self._offset)
+        sched_ver = self._sched_ver
+
+        # daily scheduling cutoff time in hours
+        rollover: Optional[int]
+        if sched_ver >= 2:
+            rollover = self._col.conf.get("rollover", 4)
+            offset = rollover
+        else:
+            rollover = None
+            offset = datetime.datetime.fromtimestamp(self._col.crt).hour
+
+        # be defensive as col.crt can transiently be None (e.g. when importing colpkgs)
+        creation_time = getattr(self._col, "crt", None)
+
+        time_context = TimeContext(
+            # unix epoch timestamp in seconds for today (00:00 UTC)
+            today=local_daystart(offset=offset),
+            offset=offset,
+            sched_ver=sched_ver,
+            rollover=rollover,
+            creation_day=local_daystart(creation_time) if creation_time else None,
+        )
+
+        if self._verify_day_bucketing or isDebuggingOn():
+            self.__verify_time_context(time_context, creation_time)
+
+        return time_context
 
     # Time limits
     #########################################################################
 
     def _get_time_limits(
-        self, limhist: Optional[int] = None, limfcst: Optional[int] = None
+        self,
+        time_context: TimeContext,
+        limhist: Optional[int] = None,
+        limfcst: Optional[int] = None,
     ) -> Tuple[Optional[int], Optional[int]]:
 
         conf = self._config["synced"]
@@ -299,40 +433,40 @@ class ActivityReporter:
         forecast_stop: Optional[int]
 
         if limhist is not None:
-            history_start = self._days_from_today(-limhist)
+            history_start = time_context.days_from_today(-limhist)
         else:
             history_start = self._get_conf_history_limit(
-                conf["limhist"], conf["limdate"]
+                time_context, conf["limhist"], conf["limdate"]
             )
 
         if limfcst is not None:
-            forecast_stop = self._days_from_today(limfcst)
+            forecast_stop = time_context.days_from_today(limfcst)
         else:
-            forecast_stop = self._get_conf_forecast_limit(conf["limfcst"])
+            forecast_stop = self._get_conf_forecast_limit(time_context, conf["limfcst"])
 
         return (history_start, forecast_stop)
 
     def _get_conf_history_limit(
-        self, limit_days: Optional[int], limit_date: Optional[int]
+        self,
+        time_context: TimeContext,
+        limit_days: Optional[int],
+        limit_date: Optional[int],
     ) -> Optional[int]:
 
         if limit_days is None and limit_date is None:
             return None
 
         if limit_days:
-            limit_days_date = self._days_from_today(-limit_days)
+            limit_days_date = time_context.days_from_today(-limit_days)
         else:
             limit_days_date = 0
 
-        limit_date = daystart_epoch(self._db, str(limit_date)) if limit_date else None
-
-        # be defensive as col.crt can transiently be None (e.g. when importing colpkgs)
-        creation_time = getattr(self._col, "crt", None)
+        limit_date = local_daystart(limit_date) if limit_date else None
 
         if (
             not limit_date
-            or not creation_time
-            or limit_date == daystart_epoch(self._db, creation_time)
+            or not time_context.creation_day
+            or limit_date == time_context.creation_day
         ):
             # ignore zero value or default value
             limit_date = 0
@@ -342,67 +476,47 @@ class ActivityReporter:
         # choose most restricting limit
         return max(limit_days_date, limit_date) or None
 
-    def _get_conf_forecast_limit(self, limit_days: int) -> int:
+    def _get_conf_forecast_limit(
+        self, time_context: TimeContext, limit_days: int
+    ) -> int:
         limit_days = limit_days or MAX_FORECAST_DAYS
-        return self._days_from_today(limit_days)
-
-    def _days_from_today(self, days: int) -> int:
-        return self._today + 86400 * days
+        return time_context.days_from_today(limit_days)
 
     # Deck limits
     #########################################################################
 
-    def _valid_decks(self, excluded: List[DeckId]) -> List[DeckId]:
-        deck_manager = self._col.decks
-        all_excluded = []
-
-        for did in excluded:
-            try:
-                children = [d[1] for d in deck_manager.children(did)]
-            except NotFoundError:  # 2.1.28+
-                continue
-            all_excluded.extend(children)
-
-        all_excluded.extend(excluded)
-
-        return [d["id"] for d in self._col.decks.all() if d["id"] not in all_excluded]
+    def _valid_decks(self, excluded: List[DeckId]) -> AbstractSet[DeckId]:
+        return self._deck_index.excluding(excluded)
 
-    def _did_limit(self, current_deck_only: bool) -> str:
+    def _report_decks(
+        self, current_deck_only: bool, deck_id: Optional[DeckId] = None
+    ) -> Optional[AbstractSet[DeckId]]:
+        """
+        Return decks to include in report, None for all decks
+        """
+        if current_deck_only:
+            return self.__get_active_deck_ids(deck_id)
         excluded_dids: List[DeckId] = self._config["synced"]["limdecks"]
-        if not current_deck_only:
-            if excluded_dids:
-                dids = self._valid_decks(excluded_dids)
-            else:
-                dids = [d["id"] for d in self._col.decks.all()]
-        else:
-            dids = self.__get_active_deck_ids()
-        return ids2str(dids)
-
-    def _revlog_limit(self, current_deck_only: bool) -> str:
-        excluded_dids = self._config["synced"]["limdecks"]
-        ignore_deleted = self._config["synced"]["limcdel"]
-        if not current_deck_only:
-            if excluded_dids:
-                dids = self._valid_decks(excluded_dids)
-            elif ignore_deleted:
-                # Limiting log entries to cids with assigned dids automatically
-                # excludes deleted entries. In cases where we do not use a deck
-                # limit we specify the following instead:
-                return "cid IN (SELECT id FROM cards)"
-            else:
-                return ""
-        else:
-            dids = self.__get_active_deck_ids()
-        return "cid IN (SELECT id FROM cards WHERE did IN %s)" % ids2str(dids)
-
-    def __get_active_deck_ids(self) -> List["DeckId"]:
-        deck_manager = self._col.decks
-        try:
-            selected_deck = deck_manager.get_current_id()
-        except AttributeError:
-            selected_deck = deck_manager.selected()
-        active_deck_ids = deck_manager.deck_and_child_ids(selected_deck)
-        return active_deck_ids
+        if excluded_dids:
+            return self._valid_decks(excluded_dids)
+        return None
+
+    def _include_deleted(self, dids: Optional[AbstractSet[DeckId]]) -> bool:
+        # Limiting log entries to cards with assigned decks automatically
+        # excludes deleted entries. Without a deck limit we need to check
+        # the corresponding setting instead:
+        return dids is None and not self._config["synced"]["limcdel"]
+
+    def __get_active_deck_ids(
+        self, deck_id: Optional[DeckId] = None
+    ) -> AbstractSet[DeckId]:
+        if deck_id is None:
+            deck_manager = self._col.decks
+            try:
+                deck_id = deck_manager.get_current_id()
+            except AttributeError:
+                deck_id = deck_manager.selected()
+        return self._deck_index.subtree(deck_id)
 
     # Other settings affecting included revlog entries
     #########################################################################
@@ -411,123 +525,88 @@ class ActivityReporter:
     def _ignore_rescheduled_entries(self) -> bool:
         return self._config["synced"]["limresched"]
 
-    # Database queries for user activity
+    # User activity
     #########################################################################
 
+    def _snapshot(
+        self,
+        time_context: TimeContext,
+        history_start: Optional[int] = None,
+        signature: Optional[ChangeSignature] = None,
+    ) -> ActivitySnapshot:
+        return self._engine.snapshot(
+            today=time_context.today,
+            offset=time_context.offset,
+            ignore_rescheduled=self._ignore_rescheduled_entries,
+            history_start=history_start,
+            signature=signature,
+        )
+
     def _cards_due(
         self,
+        time_context: TimeContext,
+        snapshot: ActivitySnapshot,
+        dids: Optional[AbstractSet[DeckId]],
         start: Optional[int] = None,
         stop: Optional[int] = None,
-        current_deck_only: bool = False,
     ) -> List[Sequence[int]]:
-        """[summary]
-
-        Args:
-            start (Optional[int], optional): [description]. Defaults to None.
-            stop (Optional[int], optional): [description]. Defaults to None.
+        """
+        dids: decks to include, None for all decks (cf. _report_decks)
+        start, stop: timestamps in seconds. Set to None for unlimited.
+        start: inclusive; stop: exclusive
 
         Returns:
-            List[List[int]]: [[int, int]]
+            [[int, int]**]: day timestamp, negative count of due cards
         """
-        # start, stop: timestamps in seconds. Set to None for unlimited.
-        # start: inclusive; stop: exclusive
-
-        lim = ""
-        if start is not None:
-            lim += " AND day >= {}".format(start)
-        if stop is not None:
-            lim += " AND day < {}".format(stop)
-        cmd = """
-SELECT
-STRFTIME('%s', 'now', '-{} hours', 'localtime', 'start of day')
-    + (due - ?) * 86400
-AS day, -COUNT(), due -- negative to support heatmap legend
-FROM cards
-WHERE did IN {} AND queue IN (2,3)
-{}
-GROUP BY day ORDER BY day""".format(
-            self._offset, self._did_limit(current_deck_only), lim
-        )
-
-        res: List[Sequence[int]] = self._db.all(cmd, self._col.sched.today)
+        res = snapshot.forecast_days(dids=dids, start=start, stop=stop)
 
         if isDebuggingOn():
-            self.__debug_cards_due(cmd, res)
+            self.__debug_cards_due(time_context, res)
 
-        return [i[:-1] for i in res]
+        return res
 
     def _cards_done(
         self,
+        snapshot: ActivitySnapshot,
+        dids: Optional[AbstractSet[DeckId]],
         start: Optional[int] = None,
-        current_deck_only: bool = False,
     ) -> List[Sequence[int]]:
         """
+        dids: decks to include, None for all decks (cf. _report_decks)
         start: timestamp in seconds to start reporting from
 
-        Group revlog entries by day while taking local timezone and DST
-        settings into account. Return as unix timestamps of UTC day start
-        (00:00:00 UTC+0 of each day)
-
-        We perform the grouping here instead of passing the raw data on to
-        cal-heatmap because of performance reasons (user revlogs can easily
-        reach >100K entries).
-
-        Grouping-by-day needs to be timezone-aware to assign the recorded
-        timestamps to the correct day. For that reason we include the
-        'localtime' strftime modifier, even though it does come at a
-        performance penalty
-
         Returns:
-            [[int, int]**]
+            [[int, int]**]: day timestamp, review count
         """
-        offset = self._offset * 3600
-
-        lims = []
-        if start is not None:
-            lims.append("day >= {}".format(start))
-
-        if self._ignore_rescheduled_entries:
-            lims.append("ease >= 1")
-
-        deck_limit = self._revlog_limit(current_deck_only)
-        if deck_limit:
-            lims.append(deck_limit)
-
-        lim = "WHERE " + " AND ".join(lims) if lims else ""
-
-        cmd = """\
-SELECT CAST(STRFTIME('%s', id / 1000 - {}, 'unixepoch',
-                     'localtime', 'start of day') AS int)
-AS day, COUNT()
-FROM revlog {}
-GROUP BY day ORDER BY day""".format(
-            offset, lim
+        return snapshot.history_days(
+            dids=dids, include_deleted=self._include_deleted(dids), start=start
         )
 
-        res = self._db.all(cmd)
-
-        if isDebuggingOn():
-            self.__debug_cards_done(cmd, res)
-
-        return res
-
-    def __debug_cards_due(self, cmd: str, res: List[Sequence[int]]):
-        sched_ver = self._sched_ver
-        if sched_ver >= 2:
-            offset = self._col.conf.get("rollover", 4)
-        else:
-            startDate = datetime.datetime.fromtimestamp(self._col.crt)
-            offset = startDate.hour
+    def __verify_time_context(
+        self, time_context: TimeContext, creation_time: Optional[int]
+    ):
+        expected = (
+            daystart_epoch(
+                self._db, "now", is_timestamp=False, offset=time_context.offset
+            ),
+            daystart_epoch(self._db, creation_time) if creation_time else None,
+        )
+        actual = (time_context.today, time_context.creation_day)
+        if actual != expected:
+            logger.error(
+                "Day starts do not match SQLite localtime handling. "
+                "Timezone: %s, today/creation day: %s, expected: %s",
+                local_tz_fingerprint(),
+                actual,
+                expected,
+            )
 
-        try:
-            day_cutoff = self._col.sched.day_cutoff
-        except AttributeError:
-            day_cutoff = self._col.sched.dayCutoff
+    def __debug_cards_due(self, time_context: TimeContext, res: List[Sequence[int]]):
+        day_cutoff = self._day_cutoff
 
-        logger.debug(cmd)
         logger.debug(self._col.sched.today)
-        logger.debug("Scheduler version %s", sched_ver)
-        logger.debug("Day starts at setting: %s hours", offset)
+        logger.debug("Scheduler version %s", time_context.sched_ver)
+        logger.debug("Day starts at setting: %s hours", time_context.offset)
         logger.debug(
             time.strftime(
                 "dayCutoff: %Y-%m-%d %H:%M",
@@ -547,7 +626,3 @@ GROUP BY day ORDER BY day""".format(
                 )
             )
         logger.debug(res)
-
-    def __debug_cards_done(self, cmd: str, res: List[Sequence[int]]):
-        logger.debug(cmd)
-        logger.debug(res)
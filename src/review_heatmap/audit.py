@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+EXPLAIN QUERY PLAN auditing of the add-on's SQL statements
+
+While enabled, database handles passed through QueryAuditor.wrap record
+every statement along with its bound parameters and SQLite's query plan,
+flagging full scans of the revlog and cards tables. Handles are only
+wrapped while auditing, so there is no overhead otherwise.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import deque
+from html import escape
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from .debug import logger
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.dbproxy import DBProxy
+
+    from .libaddon.anki.configmanager import ConfigManager
+
+WATCHED_TABLES: Tuple[str, ...] = ("revlog", "cards")
+
+_re_scan = re.compile(r"^SCAN (?:TABLE )?(\w+)(.*)$")
+
+
+class QueryPlan(NamedTuple):
+    sql: str
+    params: Tuple[Any, ...]
+    plan: Tuple[str, ...]  # EXPLAIN QUERY PLAN details
+    table_scans: Tuple[str, ...]  # watched tables read row by row
+    index_scans: Tuple[str, ...]  # watched tables read through a full index scan
+
+
+class AuditedDB:
+    """
+    DBProxy wrapper recording the plan of each statement before running it
+    """
+
+    def __init__(self, db: "DBProxy", auditor: "QueryAuditor"):
+        self._db = db
+        self._auditor = auditor
+
+    def all(self, sql: str, *args: Any, **kwargs: Any) -> List[Any]:
+        self._auditor.record(self._db, sql, args, kwargs)
+        return self._db.all(sql, *args, **kwargs)
+
+    def first(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        self._auditor.record(self._db, sql, args, kwargs)
+        return self._db.first(sql, *args, **kwargs)
+
+    def scalar(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        self._auditor.record(self._db, sql, args, kwargs)
+        return self._db.scalar(sql, *args, **kwargs)
+
+    def list(self, sql: str, *args: Any, **kwargs: Any) -> List[Any]:
+        self._auditor.record(self._db, sql, args, kwargs)
+        return self._db.list(sql, *args, **kwargs)
+
+    def execute(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        self._auditor.record(self._db, sql, args, kwargs)
+        return self._db.execute(sql, *args, **kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._db, name)
+
+
+class QueryAuditor:
+    def __init__(self, max_records: int = 500):
+        self._records: Deque[QueryPlan] = deque(maxlen=max_records)
+        self._lock = threading.Lock()
+        self._enabled: bool = False
+
+    @property
+    def enabled(self) -> bool:
+        return self._enabled
+
+    def set_enabled(self, enabled: bool):
+        self._enabled = enabled
+
+    def wrap(self, db: "DBProxy") -> "DBProxy":
+        """
+        Return an auditing wrapper of db while enabled, db itself otherwise
+        """
+        if not self._enabled or isinstance(db, AuditedDB):
+            return db
+        return AuditedDB(db, self)  # type: ignore[return-value]
+
+    def record(
+        self,
+        db: "DBProxy",
+        sql: str,
+        args: Sequence[Any],
+        kwargs: Dict[str, Any],
+    ):
+        if not self._enabled:
+            return
+        try:
+            rows = db.all("EXPLAIN QUERY PLAN " + sql, *args, **kwargs)
+        except Exception as exception:
+            logger.debug("Could not explain query %s: %s", sql, exception)
+            plan: Tuple[str, ...] = (f"(no plan: {exception})",)
+        else:
+            plan = tuple(str(row[-1]) for row in rows)
+
+        table_scans, index_scans = [], []
+        for detail in plan:
+            match = _re_scan.match(detail)
+            if not match or match[1] not in WATCHED_TABLES:
+                continue
+            if "INDEX" in match[2]:
+                index_scans.append(match[1])
+            else:
+                table_scans.append(match[1])
+
+        params = tuple(args) if args else tuple(sorted(kwargs.items()))
+
+        with self._lock:
+            self._records.append(
+                QueryPlan(
+                    sql=sql,
+                    params=params,
+                    plan=plan,
+                    table_scans=tuple(table_scans),
+                    index_scans=tuple(index_scans),
+                )
+            )
+
+    def records(self) -> List[QueryPlan]:
+        """
+        Recorded plans in order of execution, repeated statements omitted
+        """
+        with self._lock:
+            records = list(self._records)
+        seen = set()
+        unique = []
+        for record in records:
+            key = (record.sql, record.params)
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(record)
+        return unique
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def dump(self):
+        """
+        Write the audit report to the debug log
+        """
+        logger.debug(format_plans(self.records()))
+
+
+def format_plans(records: List[QueryPlan]) -> str:
+    table_scans = sum(1 for record in records if record.table_scans)
+    lines = [
+        "{} statements, {} with full table scans of {}".format(
+            len(records), table_scans, "/".join(WATCHED_TABLES)
+        )
+    ]
+    for record in records:
+        flags = [f"TABLE SCAN {table}" for table in record.table_scans]
+        flags += [f"INDEX SCAN {table}" for table in record.index_scans]
+        lines.append("")
+        lines.append("[{}]".format(", ".join(flags) if flags else "ok"))
+        lines.append(record.sql.strip())
+        if record.params:
+            lines.append(f"  params: {record.params!r}")
+        lines.extend(f"  plan: {detail}" for detail in record.plan)
+    return "\n".join(lines)
+
+
+def plans_html(records: List[QueryPlan]) -> str:
+    if not records:
+        return "<p>No statements recorded.</p>"
+    return "<pre>{}</pre>".format(escape(format_plans(records)))
+
+
+def audit_report_queries(
+    col: "Collection",
+    configs: Iterable["ConfigManager"],
+    extra_queries: Sequence[Callable[["DBProxy"], Any]] = (),
+) -> List[QueryPlan]:
+    """
+    Audit the statements behind a full set of reports for each of the
+    given configurations, both without an activity store (full history
+    queries) and with a fresh one (incremental and windowed queries).
+
+    extra_queries: callables issuing further statements on the audited db
+    """
+    from .activity import ActivityReporter
+    from .finder import _find_cards_reviewed_between
+    from .store import ActivityStore
+
+    was_enabled = auditor.enabled
+    auditor.set_enabled(True)
+    auditor.clear()
+    store_dir = tempfile.mkdtemp(prefix="review_heatmap_audit")
+    try:
+        for index, config in enumerate(configs):
+            store = ActivityStore(os.path.join(store_dir, f"{index}.json"))
+            for reporter in (
+                ActivityReporter(col, config),
+                ActivityReporter(col, config, store=store),
+            ):
+                reporter.get_report(limhist=365, limfcst=365)
+                reporter.get_report()
+                reporter.get_report(current_deck_only=True)
+        db = auditor.wrap(col.db)
+        _find_cards_reviewed_between(db, 0, 0)
+        for query in extra_queries:
+            query(db)
+        return auditor.records()
+    finally:
+        auditor.set_enabled(was_enabled)
+        shutil.rmtree(store_dir, ignore_errors=True)
+
+
+auditor = QueryAuditor()
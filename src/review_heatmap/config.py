@@ -33,65 +33,13 @@
 Handles add-on configuration
 """
 
-from typing import Dict
-
 from aqt import mw
 
-from .consts import ADDON
+from .defaults import config_defaults, heatmap_colors, heatmap_modes
 from .libaddon.anki.configmanager import ConfigManager
 
 __all__ = ["heatmap_colors", "heatmap_modes", "config_defaults", "config"]
 
-# NOTE: Order is important for a predictable selection dropdown.
-# NOTE: Preserving the (key, dict) pair even though the dict only contains one
-# key in case we need to provide additional info on each theme in the future.
-
-heatmap_colors: Dict[str, Dict[str, str]] = {
-    "lime": {"label": "Lime"},
-    "olive": {"label": "Olive"},
-    "ice": {"label": "Ice"},
-    "magenta": {"label": "Magenta"},
-    "flame": {"label": "Flame"},
-}
-
-heatmap_modes: Dict[str, Dict] = {
-    "year": {
-        "label": "Yearly Overview",
-        "domain": "year",
-        "subDomain": "day",
-        "range": 1,
-        "domLabForm": "%Y",
-    },
-    "months": {
-        "label": "Continuous Timeline",
-        "domain": "month",
-        "subDomain": "day",
-        "range": 9,
-        "domLabForm": "%b '%y",
-    },
-}
-
-
-config_defaults: Dict[str, Dict] = {
-    "synced": {
-        "colors": "lime",
-        "mode": "year",
-        "limdate": 0,
-        "limhist": 0,
-        "limfcst": 0,
-        "limcdel": False,
-        "limresched": True,
-        "limdecks": [],
-        "version": ADDON.VERSION,
-    },
-    "profile": {
-        "display": {"deckbrowser": True, "overview": True, "stats": True},
-        "statsvis": True,
-        "hotkeys": {},
-        "version": ADDON.VERSION,
-    },
-}
-
 config: ConfigManager = ConfigManager(
     mw, config_dict=config_defaults, conf_key="heatmap", reset_req=True
 )
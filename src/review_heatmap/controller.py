@@ -33,28 +33,65 @@
 Overarching control of heatmap rendering and state
 """
 
-from typing import TYPE_CHECKING, Optional
+import json
+import os
+from concurrent.futures import Future
+from itertools import count
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 
 from aqt.main import AnkiQt
 
-from .activity import ActivityReporter
-from .renderer import HeatmapRenderer, HeatmapView
-from .web_bridge import HeatmapBridge
+from .activity import ActivityReport, ActivityReporter
+from .engine import ChangeSignature
+from .environment import MODULE_ADDON
 from .errors import CollectionError
+from .indexes import IndexManager, format_size
+from .instrumentation import instrumentation
+from .libaddon.debug import logger
+from .libaddon.platform import pathUserFiles
+from .renderer import HeatmapRenderer, HeatmapView, RenderKey
+from .stats_service import HeatmapStats
+from .store import ActivityStore
+from .web_bridge import HeatmapBridge
 
 if TYPE_CHECKING:
+    from anki.cards import Card
+    from anki.collection import Collection
+    from aqt.reviewer import Reviewer
+    from aqt.webview import AnkiWebView
+
     from .libaddon.anki.configmanager import ConfigManager
 
 
+# reports are only shared between requests for the same view and state
+_PendingKey = Tuple[RenderKey, ChangeSignature]
+
+
 class HeatmapController:
     def __init__(self, mw: AnkiQt, config: "ConfigManager"):
         self._mw = mw
         self._config: ConfigManager = config
 
-        self._bridge: Optional[HeatmapBridge] = HeatmapBridge(self._mw, self._config)
+        self._bridge: Optional[HeatmapBridge] = HeatmapBridge(
+            self._mw, self._config, data_provider=self._heatmap_data
+        )
         self._bridge.register()
+        self._register_hooks()
 
+        self._reporter: Optional[ActivityReporter] = None
         self._renderer: Optional[HeatmapRenderer] = None
+        self._col: Optional["Collection"] = None
+
+        self.stats: HeatmapStats = HeatmapStats(self._get_reporter, self._config)
+        self.stats.subscribe(self._save_legacy_stats)
+
+        # change signature, deck and forecast due day before the current answer
+        self._before_answer: Optional[Tuple[ChangeSignature, int, Optional[int]]] = None
+
+        self._placeholder_ids = count()
+        # placeholders waiting on the same background task
+        self._pending: Dict[_PendingKey, List[Tuple["AnkiWebView", str]]] = {}
+        self._creating_indexes: bool = False
 
     def render_for_view(
         self,
@@ -62,19 +99,246 @@ class HeatmapController:
         limhist: Optional[int] = None,
         limfcst: Optional[int] = None,
         current_deck_only: bool = False,
+        web: Optional["AnkiWebView"] = None,
+    ) -> str:
+        """
+        Render heatmap HTML for the given view.
+
+        If a web view is passed and background loading is enabled, cache
+        misses are answered with a placeholder that is filled in through
+        the bridge once the report has been computed off the main thread.
+        """
+        with instrumentation.trace(f"{view.name} render"):
+            return self._render(view, limhist, limfcst, current_deck_only, web)
+
+    def _render(
+        self,
+        view: HeatmapView,
+        limhist: Optional[int],
+        limfcst: Optional[int],
+        current_deck_only: bool,
+        web: Optional["AnkiWebView"],
     ) -> str:
+        renderer = self._get_renderer()
+
+        if web is None or not self._config["profile"]["asyncrender"]:
+            return renderer.render(view, limhist, limfcst, current_deck_only)
+
+        # captured now, so that the report is computed and cached for the
+        # deck and collection state the request was made for
+        key = renderer.cache_key(view, limhist, limfcst, current_deck_only)
+        signature = renderer.change_signature()
+
+        cached = renderer.cached(key, signature)
+        if cached is not None:
+            return cached
+
+        placeholder_id = f"rh-placeholder-{next(self._placeholder_ids)}"
+        pending_key = (key, signature)
+
+        waiting = self._pending.get(pending_key)
+        if waiting is not None:
+            # an identical report is already underway, no need to start another
+            waiting.append((web, placeholder_id))
+        else:
+            self._pending[pending_key] = [(web, placeholder_id)]
+            self._mw.taskman.run_in_background(
+                lambda: self._background_report(renderer, key, signature),
+                lambda future: self._on_report_done(renderer, pending_key, future),
+            )
+
+        return renderer.render_placeholder(view, placeholder_id)
+
+    def _heatmap_data(
+        self,
+        view: HeatmapView,
+        limhist: Optional[int],
+        limfcst: Optional[int],
+        current_deck_only: bool,
+        start: Optional[int],
+        stop: Optional[int],
+    ) -> Optional[Dict[str, Any]]:
+        with instrumentation.trace(f"{view.name} data"):
+            data = self._get_renderer().heatmap_data(
+                view, limhist, limfcst, current_deck_only, start, stop
+            )
+            with instrumentation.phase("payload") as phase:
+                if phase:
+                    # mirrors the encoding pycmd callbacks go through
+                    phase.size = len(json.dumps(data))
+        return data
+
+    def _get_renderer(self) -> HeatmapRenderer:
+        self._bind_collection()
+        return self._renderer  # type: ignore[return-value]
+
+    def _get_reporter(self) -> ActivityReporter:
+        self._bind_collection()
+        return self._reporter  # type: ignore[return-value]
+
+    def _bind_collection(self):
         col = self._mw.col
         if not col:
             raise CollectionError("Anki collection and/or database is not ready")
 
-        if not self._renderer:
-            reporter = ActivityReporter(col, self._config)
-            self._renderer = HeatmapRenderer(self._mw, reporter, self._config)
-        else:
-            pass
-            # self._renderer.set_activity_reporter(reporter)
+        if self._renderer and col is self._col:
+            return
+
+        # (re-)bind to current collection, e.g. after a profile switch
+        self._reporter = ActivityReporter(col, self._config, store=self._create_store())
+        self._renderer = HeatmapRenderer(
+            self._mw, self._reporter, self._config, stats=self.stats
+        )
+        self._col = col
+        self._pending.clear()
+        self.stats.invalidate()
+        self._sync_indexes()
+
+    @staticmethod
+    def _background_report(
+        renderer: HeatmapRenderer, key: RenderKey, signature: ChangeSignature
+    ) -> Optional[ActivityReport]:
+        with instrumentation.trace(f"{key.view.name} report (background)"):
+            return renderer.report(key, signature)
+
+    def _on_report_done(
+        self,
+        renderer: HeatmapRenderer,
+        pending_key: _PendingKey,
+        future: Future,
+    ):
+        if renderer is not self._renderer:
+            # collection changed while we were busy
+            return
+
+        waiting = self._pending.pop(pending_key, [])
+        key, signature = pending_key
+
+        try:
+            report = future.result()
+        except Exception:
+            logger.exception("Could not compute heatmap report in background")
+            report = None
+
+        with instrumentation.trace(f"{key.view.name} render (background)"):
+            html = renderer.render_report(report, key, signature)
+
+        if not self._bridge:
+            return
+
+        for web, placeholder_id in waiting:
+            self._bridge.push_render(web, placeholder_id, html)
+
+    # Optional indexes
+    #########################################################################
+
+    def _sync_indexes(self):
+        """
+        Create or drop the add-on's indexes to match the options. Also runs
+        on each reset (e.g. after 'Check Database' or saving the options),
+        so that indexes lost along the way are recreated.
+        """
+        col = self._mw.col
+        if not col or self._creating_indexes:
+            return
+        manager = IndexManager(col.db)
+
+        if not self._config["profile"]["indexes"]:
+            if manager.present():
+                freed = manager.drop()
+                logger.info("Dropped add-on indexes, freed %s", format_size(freed))
+            return
+
+        missing = manager.missing()
+        if not missing:
+            return
+        logger.info(
+            "Creating add-on indexes: %s", ", ".join(index.name for index in missing)
+        )
+
+        # index creation reads through entire tables, keep it off the main thread
+        self._creating_indexes = True
+        self._mw.taskman.run_in_background(manager.create, self._on_indexes_created)
+
+    def _on_indexes_created(self, future: Future):
+        self._creating_indexes = False
+        try:
+            size = future.result()
+        except Exception:
+            logger.exception("Could not create add-on indexes")
+            return
+        logger.info("Created add-on indexes, using %s on disk", format_size(size))
+
+    def _on_addons_will_delete(self, dialog: Any, ids: List[str]):
+        if MODULE_ADDON not in ids:
+            return
+        from anki.hooks import remHook
+
+        # indexes are of no use without the add-on's queries, so drop them
+        # and keep them from being recreated until Anki is restarted
+        remHook("reset", self._sync_indexes)
+        if self._mw.col:
+            IndexManager(self._mw.col.db).drop()
+
+    def _register_hooks(self):
+        from anki.hooks import addHook
+        from aqt import gui_hooks
+        from aqt.gui_hooks import reviewer_did_answer_card, reviewer_will_answer_card
+
+        reviewer_will_answer_card.append(self._on_reviewer_will_answer_card)
+        reviewer_did_answer_card.append(self._on_reviewer_did_answer_card)
+        # only available on Anki 2.1.45+
+        will_delete_addons = getattr(
+            gui_hooks, "addons_dialog_will_delete_addons", None
+        )
+        if will_delete_addons is not None:
+            will_delete_addons.append(self._on_addons_will_delete)
+        # runs after saving the options and after 'Check Database'
+        addHook("reset", self._sync_indexes)
+
+    def _on_reviewer_will_answer_card(
+        self, ease_tuple: Tuple[bool, int], reviewer: "Reviewer", card: "Card"
+    ) -> Tuple[bool, int]:
+        if self._renderer and self._mw.col is self._col:
+            # only probes if the collection was modified outside of reviews
+            # since the signature was last taken or derived
+            previous_due = card.due if card.queue in (2, 3) else None
+            self._before_answer = (
+                self._renderer.change_signature(),
+                card.did,
+                previous_due,
+            )
+        return ease_tuple
+
+    def _on_reviewer_did_answer_card(
+        self, reviewer: "Reviewer", card: "Card", ease: int
+    ):
+        before_answer = self._before_answer
+        self._before_answer = None
+        if not self._renderer or self._mw.col is not self._col or not before_answer:
+            return
+        # keep today's count and stats current without re-running any
+        # of the report queries
+        self._renderer.record_review(card, *before_answer)
+
+    def _save_legacy_stats(self, stats: HeatmapStats):
+        # mw attributes predating the stats service, kept for add-ons that
+        # still read them
+        report = stats.report
+        self._mw._hmStreakMax = (  # type: ignore
+            report.streak_max.value if report else None
+        )
+        self._mw._hmStreakCur = (  # type: ignore
+            report.streak_cur.value if report else None
+        )
+        self._mw._hmActivityDailyAvg = (  # type: ignore
+            report.activity_daily_avg.value if report else None
+        )
 
-        return self._renderer.render(view, limhist, limfcst, current_deck_only)
+    def _create_store(self) -> ActivityStore:
+        profile_name = self._mw.pm.name or "default"
+        path = os.path.join(pathUserFiles(), "activity", f"{profile_name}.json")
+        return ActivityStore(path)
 
 
 def initialize_controller(mw: "AnkiQt", config: "ConfigManager") -> HeatmapController:
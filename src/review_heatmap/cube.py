@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Compact, array-backed storage of per-deck daily activity
+"""
+
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+
+from .store import DeckActivity
+
+try:
+    import numpy as np
+except ImportError:  # numpy is not part of Anki's standard distribution
+    np = None
+
+# Row key: deck ID, or None for reviews of deleted cards
+CubeKey = Optional[int]
+# Row: index of first day (days since epoch), counts of consecutive days
+CubeRow = Tuple[int, Sequence[int]]
+
+_DAY = 86400
+# number of merged deck sets to keep per cube
+_MERGED_LIMIT = 16
+
+
+class ActivityCube:
+    """
+    Day × deck activity matrix
+
+    Each deck is stored as a single unsigned int array spanning the deck's
+    first to last active day, which keeps the matrix compact for collections
+    with thousands of sparsely used decks. Reports limited to a subset of
+    decks are computed by summing the corresponding rows, using NumPy when
+    available.
+
+    Sums for a frozenset of keys (or all keys) are materialized on first
+    use, so repeated reports on the same deck set only slice a single row.
+    As deck sets are handed out by the deck tree index, they remain the
+    same objects until decks are added, removed, or renamed.
+    """
+
+    __slots__ = ("_rows", "_merged")
+
+    def __init__(self, rows: Optional[Dict[CubeKey, CubeRow]] = None):
+        self._rows: Dict[CubeKey, CubeRow] = rows if rows is not None else {}
+        self._merged: Dict[Optional[FrozenSet[CubeKey]], Optional[CubeRow]] = {}
+
+    @classmethod
+    def from_activity(
+        cls,
+        activity: DeckActivity,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+    ) -> "ActivityCube":
+        """
+        activity: deck ID -> day timestamp -> count
+        start, stop: timestamps in seconds limiting the days to include
+                     (start inclusive, stop exclusive). Protects against
+                     allocating huge rows for invalid dates.
+        """
+        rows: Dict[CubeKey, CubeRow] = {}
+        for key, days in activity.items():
+            if start is not None or stop is not None:
+                days = {
+                    day: count
+                    for day, count in days.items()
+                    if (start is None or day >= start) and (stop is None or day < stop)
+                }
+            if not days:
+                continue
+            first = min(days) // _DAY
+            last = max(days) // _DAY
+            counts = array("I", bytes(4 * (last - first + 1)))
+            for day, count in days.items():
+                counts[day // _DAY - first] = count
+            rows[key] = (first, counts)
+        return cls(rows)
+
+    @classmethod
+    def from_day_numbers(
+        cls, rows: Iterable[Sequence[Optional[int]]], origin: int
+    ) -> "ActivityCube":
+        """
+        rows: (day number, key, count) rows, e.g. cards grouped by scheduler
+              due day and deck. A key may appear on several rows per day.
+        origin: index of day number 0 (days since epoch)
+
+        Day numbers are translated into timestamps only when reading days
+        back out, i.e. once per distinct day rather than once per row.
+        """
+        grouped: Dict[CubeKey, Dict[int, int]] = {}
+        for number, key, count in rows:
+            days = grouped.get(key)
+            if days is None:
+                days = grouped[key] = {}
+            days[number] = days.get(number, 0) + count  # type: ignore[index]
+
+        cube_rows: Dict[CubeKey, CubeRow] = {}
+        for key, days in grouped.items():
+            first = min(days)
+            counts = array("I", bytes(4 * (max(days) - first + 1)))
+            for number, count in days.items():
+                counts[number - first] = count
+            cube_rows[key] = (first + origin, counts)
+        return cls(cube_rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def keys(self) -> Iterable[CubeKey]:
+        return self._rows.keys()
+
+    def row(self, key: CubeKey) -> Optional[CubeRow]:
+        return self._rows.get(key)
+
+    def total(
+        self,
+        keys: Optional[Iterable[CubeKey]] = None,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+    ) -> CubeRow:
+        """
+        Sum rows of given keys (all rows if None), limited to timestamps in
+        seconds between start (inclusive) and stop (exclusive)
+
+        Returns:
+            CubeRow: index of first day, counts of consecutive days
+        """
+        rows: List[CubeRow]
+        if keys is None or isinstance(keys, frozenset):
+            merged = self._merged_row(keys)
+            rows = [merged] if merged is not None else []
+        else:
+            rows = [self._rows[key] for key in keys if key in self._rows]
+        return self._sum(rows, start=start, stop=stop)
+
+    def _merged_row(self, keys: Optional[FrozenSet[CubeKey]]) -> Optional[CubeRow]:
+        try:
+            return self._merged[keys]
+        except KeyError:
+            pass
+
+        if keys is None:
+            rows = list(self._rows.values())
+        else:
+            rows = [self._rows[key] for key in keys if key in self._rows]
+
+        merged: Optional[CubeRow] = None
+        if rows:
+            first, counts = self._sum(rows)
+            merged = (first, array("I", counts))
+
+        if len(self._merged) >= _MERGED_LIMIT:
+            self._merged.clear()
+        self._merged[keys] = merged
+        return merged
+
+    @staticmethod
+    def _sum(
+        rows: List[CubeRow], start: Optional[int] = None, stop: Optional[int] = None
+    ) -> CubeRow:
+        if not rows:
+            return (0, [])
+
+        low = min(first for first, _ in rows)
+        high = max(first + len(counts) for first, counts in rows)
+        if start is not None:
+            low = max(low, -(-start // _DAY))
+        if stop is not None:
+            high = min(high, -(-stop // _DAY))
+        if high <= low:
+            return (low, [])
+
+        if len(rows) == 1:
+            first, counts = rows[0]
+            return (low, counts[low - first : high - first])
+
+        if np is not None:
+            summed = np.zeros(high - low, dtype=np.int64)
+            for first, counts in rows:
+                begin = max(low, first)
+                end = min(high, first + len(counts))
+                if begin >= end:
+                    continue
+                summed[begin - low : end - low] += np.frombuffer(
+                    counts, dtype=np.uint32
+                )[begin - first : end - first]
+            return (low, summed.tolist())
+
+        summed_list: List[int] = [0] * (high - low)
+        for first, counts in rows:
+            begin = max(low, first)
+            end = min(high, first + len(counts))
+            offset = first - low
+            for index in range(begin - first, end - first):
+                summed_list[index + offset] += counts[index]
+        return (low, summed_list)
+
+    def days(
+        self,
+        keys: Optional[Iterable[CubeKey]] = None,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+        sign: int = 1,
+    ) -> List[List[int]]:
+        """
+        Like total, but return [day timestamp, count] pairs of active days
+        """
+        first, counts = self.total(keys, start=start, stop=stop)
+        return [
+            [(first + index) * _DAY, sign * count]
+            for index, count in enumerate(counts)
+            if count
+        ]
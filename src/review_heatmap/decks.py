@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Cached deck tree lookups for deck exclusions and current deck reports
+"""
+
+from typing import (
+    TYPE_CHECKING,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from .types import DeckId
+
+if TYPE_CHECKING:
+    from anki.collection import Collection
+    from anki.dbproxy import DBProxy
+
+
+class DeckTree:
+    """
+    Parent/child structure of all decks, derived from their names
+
+    parents: deck ID -> parent deck ID (None for top-level decks)
+    children: deck ID -> IDs of direct child decks
+    """
+
+    def __init__(self, decks: Iterable[Tuple[DeckId, str]]):
+        ids_by_name: Dict[str, DeckId] = {name: did for did, name in decks}
+
+        self.ids: FrozenSet[DeckId] = frozenset(ids_by_name.values())
+        self.parents: Dict[DeckId, Optional[DeckId]] = {}
+        self.children: Dict[DeckId, List[DeckId]] = {did: [] for did in self.ids}
+
+        for name, did in ids_by_name.items():
+            parent = ids_by_name.get(name.rpartition("::")[0])
+            self.parents[did] = parent
+            if parent is not None:
+                self.children[parent].append(did)
+
+        self._subtrees: Dict[DeckId, FrozenSet[DeckId]] = {}
+
+    def subtree(self, did: DeckId) -> FrozenSet[DeckId]:
+        """
+        The given deck and all of its descendants (empty if it does not exist)
+        """
+        subtree = self._subtrees.get(did)
+        if subtree is not None:
+            return subtree
+        if did not in self.children:
+            return frozenset()
+        ids: Set[DeckId] = set()
+        pending = [did]
+        while pending:
+            current = pending.pop()
+            ids.add(current)
+            pending.extend(self.children[current])
+        subtree = self._subtrees[did] = frozenset(ids)
+        return subtree
+
+    def excluding(self, excluded: Iterable[DeckId]) -> FrozenSet[DeckId]:
+        """
+        All decks, minus the given decks and their descendants
+        """
+        remaining = set(self.ids)
+        for did in excluded:
+            remaining -= self.subtree(did)
+        return frozenset(remaining)
+
+
+class DeckTreeIndex:
+    """
+    Keeps a DeckTree of the collection, rebuilding it only when a cheap
+    probe indicates that decks have been added, removed, or renamed.
+
+    Reading deck names through the deck manager (let alone full deck
+    dicts with their configs) on every report would be a lot more costly
+    than the probe on collections with thousands of decks.
+    """
+
+    def __init__(self, col: "Collection", db: "DBProxy"):
+        self._col = col
+        self._db = db
+        # detected on first use, so that reports without deck limits do not
+        # pay for it
+        self._decks_table: Optional[bool] = None
+        self._tree: Optional[DeckTree] = None
+        self._signature: Optional[Sequence] = None
+        self._excluding: Dict[Tuple[DeckId, ...], FrozenSet[DeckId]] = {}
+
+    def tree(self) -> DeckTree:
+        signature = self._probe()
+        if self._tree is None or signature != self._signature:
+            self._tree = DeckTree(self._deck_names())
+            self._signature = signature
+            self._excluding.clear()
+        return self._tree
+
+    def excluding(self, excluded: Sequence[DeckId]) -> FrozenSet[DeckId]:
+        """
+        All decks, minus the given decks and their descendants
+        """
+        tree = self.tree()
+        key = tuple(excluded)
+        remaining = self._excluding.get(key)
+        if remaining is None:
+            remaining = self._excluding[key] = tree.excluding(excluded)
+        return remaining
+
+    def subtree(self, did: DeckId) -> FrozenSet[DeckId]:
+        return self.tree().subtree(did)
+
+    def _probe(self) -> Sequence:
+        if self._decks_table is None:
+            # schema 15+ keeps decks in a table of their own, earlier
+            # collections in a JSON column of the col table
+            self._decks_table = bool(
+                self._db.scalar(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = 'decks'"
+                )
+            )
+        if self._decks_table:
+            # renames and moves update mtime_secs, deletions the count
+            return tuple(
+                self._db.first("SELECT COUNT(), MAX(mtime_secs), TOTAL(id) FROM decks")
+            )
+        return (self._db.scalar("SELECT mod FROM col"),)
+
+    def _deck_names(self) -> List[Tuple[DeckId, str]]:
+        deck_manager = self._col.decks
+        try:
+            # 2.1.28+, skips loading deck configs
+            return [(d.id, d.name) for d in deck_manager.all_names_and_ids()]
+        except AttributeError:
+            return [(d["id"], d["name"]) for d in deck_manager.all()]
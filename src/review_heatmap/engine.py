@@ -0,0 +1,650 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Single-pass computation of review activity across all decks and views
+"""
+
+import hashlib
+import time
+from threading import RLock
+from typing import (
+    TYPE_CHECKING,
+    AbstractSet,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+if TYPE_CHECKING:
+    from anki.cards import Card
+    from anki.collection import Collection
+    from anki.dbproxy import DBProxy
+
+from .audit import auditor
+from .cube import ActivityCube
+from .debug import isDebuggingOn, logger
+from .indexes import IndexManager
+from .instrumentation import instrumentation
+from .store import ActivityStore, DeckActivity, fold_deck_activity
+from .times import DayBucketer, local_tz_fingerprint
+from .types import DeckId
+
+# limit max forecast to 200 years to protect against invalid due dates
+MAX_FORECAST_DAYS = 73000
+
+
+class ActivitySnapshot(NamedTuple):
+    """
+    Review history and forecast of the entire collection, broken down by deck
+
+    history: day × deck matrix of reviews (None key for deleted cards)
+    forecast: day × deck matrix of cards due
+    history_start: day timestamp history is complete from, None if complete
+    today: day timestamp of today
+    """
+
+    history: ActivityCube
+    forecast: ActivityCube
+    history_start: Optional[int]
+    today: int
+
+    def history_days(
+        self,
+        dids: Optional[AbstractSet[DeckId]] = None,
+        include_deleted: bool = True,
+        start: Optional[int] = None,
+    ) -> List[List[int]]:
+        """
+        dids: decks to include, None for all decks
+        include_deleted: whether to include reviews of deleted cards
+        start: timestamp in seconds to start reporting from (inclusive)
+
+        Returns:
+            [[int, int]**]: day timestamp, review count
+        """
+        keys: Optional[FrozenSet[Optional[DeckId]]]
+        if dids is None:
+            if include_deleted:
+                keys = None
+            else:
+                keys = frozenset(self.history.keys()) - {None}
+        else:
+            keys = frozenset(dids)
+            if include_deleted:
+                keys |= {None}
+        return self.history.days(keys, start=start)
+
+    def forecast_days(
+        self,
+        dids: Optional[AbstractSet[DeckId]] = None,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+    ) -> List[List[int]]:
+        """
+        dids: decks to include, None for all decks
+        start, stop: timestamps in seconds (start inclusive, stop exclusive)
+
+        Returns:
+            [[int, int]**]: day timestamp, negative count of due cards
+            (negative to support heatmap legend)
+        """
+        return self.forecast.days(dids, start=start, stop=stop, sign=-1)
+
+
+class ChangeSignature(NamedTuple):
+    """
+    Probe of the collection state reports depend on. Unlike col.mod it
+    stays unchanged on note edits, tag changes or config saves.
+
+    day_cutoff: end of the current scheduler day
+    revlog_max_id: id of the most recent revlog entry
+    revlog_rows: number of revlog entries
+    cards: card count and checksum of card ids × deck ids (catches card
+           deletions and deck changes)
+    due: count and sum of due days of review and day-learn cards
+    """
+
+    day_cutoff: int
+    revlog_max_id: Optional[int]
+    revlog_rows: int
+    cards: Tuple[float, ...]
+    due: Tuple[float, ...]
+
+
+class ReportEngine:
+    """
+    Computes review activity of all decks in one revlog pass grouped by
+    (day, deck) and one cards pass grouped by (due, deck).
+
+    Reports for the different views (whole collection, current deck, deck
+    exclusions, history and forecast limits) are then derived from the
+    resulting snapshot in memory.
+    """
+
+    def __init__(
+        self,
+        col: "Collection",
+        store: Optional[ActivityStore] = None,
+        verify_day_bucketing: bool = False,
+    ):
+        self._col: "Collection"
+        self._db: "DBProxy"
+        self._indexes: IndexManager
+
+        self._store: Optional[ActivityStore] = store
+        # cross-check day assignments against SQLite's localtime handling
+        # (always active in debug mode)
+        self._verify_day_bucketing: bool = verify_day_bucketing
+
+        self._snapshot: Optional[ActivitySnapshot] = None
+        self._snapshot_key: Optional[tuple] = None
+        # collection modification time and signature of the last change probe
+        self._probe: Optional[Tuple[int, ChangeSignature]] = None
+
+        # reports may be requested from background threads
+        self._lock = RLock()
+
+        self.set_collection(col)
+
+    def set_collection(self, col: "Collection"):
+        self._col = col
+        self._db = auditor.wrap(col.db)
+        self._indexes = IndexManager(self._db)
+        self.invalidate()
+
+    def invalidate(self):
+        self._snapshot = None
+        self._snapshot_key = None
+        self._probe = None
+
+    def change_signature(self) -> ChangeSignature:
+        """
+        The probe reads through the entire cards table, so it is only run
+        again once the collection has been modified since the last probe
+        """
+        col_mod = self._col.mod
+        probe = self._probe
+        if probe is not None and probe[0] == col_mod:
+            return probe[1]._replace(day_cutoff=self._day_cutoff)
+
+        with instrumentation.phase("change probe"):
+            # separate subqueries, so that SQLite can answer both through
+            # its MIN/MAX and COUNT optimizations
+            revlog_max_id, revlog_rows = self._db.first(
+                "SELECT (SELECT MAX(id) FROM revlog), (SELECT COUNT() FROM revlog)"
+            )
+            cards, checksum, due_cards, due_total = self._db.first(
+                """\
+SELECT COUNT(), TOTAL((id % 9973) * did), TOTAL(queue IN (2, 3)),
+TOTAL(CASE WHEN queue IN (2, 3) THEN due END) FROM cards"""
+            )
+        signature = ChangeSignature(
+            day_cutoff=self._day_cutoff,
+            revlog_max_id=revlog_max_id,
+            revlog_rows=revlog_rows,
+            cards=(cards, checksum),
+            due=(due_cards, due_total),
+        )
+        self._probe = (col_mod, signature)
+        return signature
+
+    def signature_after_review(
+        self,
+        previous: ChangeSignature,
+        card: "Card",
+        previous_did: DeckId,
+        previous_due: Optional[int] = None,
+    ) -> ChangeSignature:
+        """
+        Derive the change signature after the given card has been answered
+        from the one right before, instead of probing the collection again
+
+        previous_did: deck of the card before it was answered (cards may
+                      leave filtered decks when answered)
+        previous_due: due day number of the card before it was answered, if
+                      it was part of the forecast
+        """
+        cards, checksum = previous.cards
+        checksum += (card.id % 9973) * (card.did - previous_did)
+
+        due_cards, due_total = previous.due
+        if previous_due is not None:
+            due_cards -= 1
+            due_total -= previous_due
+        if card.queue in (2, 3):  # review, day learn
+            due_cards += 1
+            due_total += card.due
+
+        signature = ChangeSignature(
+            day_cutoff=self._day_cutoff,
+            # primary key lookup, unlike the probe's count
+            revlog_max_id=self._db.scalar("SELECT MAX(id) FROM revlog"),
+            revlog_rows=previous.revlog_rows + 1,
+            cards=(cards, checksum),
+            due=(due_cards, due_total),
+        )
+        self._probe = (self._col.mod, signature)
+        return signature
+
+    def snapshot(
+        self,
+        today: int,
+        offset: int,
+        ignore_rescheduled: bool,
+        history_start: Optional[int] = None,
+        signature: Optional[ChangeSignature] = None,
+    ) -> ActivitySnapshot:
+        """
+        today: day timestamp of today
+        offset: day rollover offset in hours
+        ignore_rescheduled: whether to exclude manual reschedules
+        history_start: earliest day the caller is interested in. Only used
+                       to avoid expensive full passes when no other complete
+                       data is available.
+        signature: change signature taken by the caller before requesting
+                   the snapshot, probed here if not set
+        """
+        with self._lock:
+            return self._get_snapshot(
+                today, offset, ignore_rescheduled, history_start, signature
+            )
+
+    def _get_snapshot(
+        self,
+        today: int,
+        offset: int,
+        ignore_rescheduled: bool,
+        history_start: Optional[int],
+        signature: Optional[ChangeSignature],
+    ) -> ActivitySnapshot:
+        if signature is None:
+            signature = self.change_signature()
+        key = (
+            signature,
+            today,
+            offset,
+            ignore_rescheduled,
+            local_tz_fingerprint(),
+        )
+        snapshot = self._snapshot
+        if (
+            snapshot is not None
+            and key == self._snapshot_key
+            and self._covers(snapshot, history_start)
+        ):
+            return snapshot
+
+        history, complete = self._history(
+            offset, ignore_rescheduled, signature.cards, history_start
+        )
+        forecast = self._forecast(today)
+
+        # protect against invalid review timestamps
+        date_limit = today + MAX_FORECAST_DAYS * 86400
+
+        snapshot = ActivitySnapshot(
+            history=ActivityCube.from_activity(history, stop=date_limit),
+            forecast=forecast,
+            history_start=None if complete else history_start,
+            today=today,
+        )
+
+        self._snapshot = snapshot
+        self._snapshot_key = key
+
+        return snapshot
+
+    @staticmethod
+    def _covers(snapshot: ActivitySnapshot, history_start: Optional[int]) -> bool:
+        if snapshot.history_start is None:
+            return True
+        return history_start is not None and history_start >= snapshot.history_start
+
+    # Review history
+    #########################################################################
+
+    def _history(
+        self,
+        offset: int,
+        ignore_rescheduled: bool,
+        cards_signature: Tuple[float, ...],
+        history_start: Optional[int] = None,
+    ) -> Tuple[DeckActivity, bool]:
+        """
+        Return per-deck review history and whether it is complete
+
+        If an activity store is available, only revlog entries logged today
+        are queried on each call. Entries from earlier days are folded into
+        the store once and then read back from there.
+        """
+        lims = ["ease >= 1"] if ignore_rescheduled else []
+
+        if self._store is None:
+            return self._query_history(lims, offset), True
+
+        fingerprint = self._store_fingerprint(lims, offset)
+        entry = self._store.get(fingerprint)
+        reviewed: Optional[Tuple[float, ...]] = None
+
+        if entry is not None and entry.cards != cards_signature:
+            # Cards were added, deleted, or moved to other decks. Stored
+            # activity only depends on cards with review history, so e.g.
+            # adding notes does not warrant a rebuild.
+            reviewed = self._reviewed_cards_signature()
+            if reviewed == entry.reviewed:
+                entry.cards = cards_signature
+
+        if (
+            entry is None
+            or entry.cards != cards_signature
+            or entry.rows != self._revlog_rows_before(entry.checkpoint)
+        ):
+            # filters changed, reviewed cards were deleted or moved, or revlog
+            # entries were added/removed retroactively
+            if history_start is not None:
+                # windowed reports (e.g. in the stats screen) are cheaper
+                # to compute directly than rebuilding the store
+                return self._query_history(lims, offset, start=history_start), False
+            if reviewed is None:
+                reviewed = self._reviewed_cards_signature()
+            entry = self._store.reset(
+                fingerprint, cards=cards_signature, reviewed=reviewed
+            )
+
+        checkpoint = (self._day_cutoff - 86400) * 1000
+
+        if entry.checkpoint < checkpoint:
+            entry.fold(
+                self._query_rows(
+                    lims, offset, id_start=entry.checkpoint, id_stop=checkpoint
+                )
+            )
+            entry.checkpoint = checkpoint
+            entry.rows = self._revlog_rows_before(checkpoint)
+            self._store.save()
+
+        history = {did: dict(days) for did, days in entry.activity.items()}
+        fold_deck_activity(
+            history, self._query_rows(lims, offset, id_start=entry.checkpoint)
+        )
+
+        return history, True
+
+    def _query_history(
+        self, lims: List[str], offset: int, start: Optional[int] = None
+    ) -> DeckActivity:
+        history: DeckActivity = {}
+        fold_deck_activity(history, self._query_rows(lims, offset, start=start))
+        return history
+
+    def _query_rows(
+        self,
+        lims: List[str],
+        offset: int,
+        start: Optional[int] = None,
+        id_start: Optional[int] = None,
+        id_stop: Optional[int] = None,
+        localtime: bool = False,
+    ) -> List[Sequence[int]]:
+        """
+        lims: additional revlog filters
+        offset: day rollover offset in hours
+        start: timestamp in seconds to start reporting from
+        id_start, id_stop: revlog id range to limit query to (start inclusive,
+        stop exclusive)
+        localtime: use SQLite's 'localtime' strftime modifier for grouping
+        instead of the precomputed UTC offset table. Slow, only used for
+        verification purposes.
+
+        Group revlog entries by day and deck while taking local timezone and
+        DST settings into account. Days are returned as unix timestamps of
+        UTC day start (00:00:00 UTC+0 of each day), decks as the deck ID of
+        the reviewed card (None for deleted cards).
+
+        We perform the grouping here instead of passing the raw data on to
+        cal-heatmap because of performance reasons (user revlogs can easily
+        reach >100K entries).
+
+        Grouping-by-day needs to be timezone-aware to assign the recorded
+        timestamps to the correct day. Evaluating the 'localtime' strftime
+        modifier for each row comes at a significant performance penalty,
+        so by default we compute the local UTC offset transitions once and
+        perform the grouping through plain integer arithmetic (cf. DayBucketer)
+
+        Returns:
+            [[int, Optional[int], int]**]: day, deck ID, review count
+        """
+        span_start = start
+        if span_start is None and id_start:
+            span_start = id_start // 1000
+        bucketer = self._day_bucketer(
+            offset, start=span_start, stop=id_stop // 1000 if id_stop else None
+        )
+
+        query_lims = list(lims)
+        if start is not None:
+            # Translate day limit into a lower revlog id bound, so that SQLite
+            # only has to scan the primary key range in question instead of
+            # evaluating the day expression for the entire table
+            id_bound = bucketer.first_timestamp(start) * 1000
+            id_bound = max(id_bound, id_start or 0)
+            query_lims.append("revlog.id >= {}".format(id_bound))
+            query_lims.append("day >= {}".format(start))
+        elif id_start:
+            query_lims.append("revlog.id >= {}".format(id_start))
+        if id_stop is not None:
+            if len(query_lims) == len(lims) and self._revlog_covered(lims):
+                # Passes over the entire revlog read less from a covering
+                # index than from the primary key range SQLite would pick
+                # otherwise. The unary plus rules out the latter.
+                query_lims.append("+revlog.id < {}".format(id_stop))
+            else:
+                query_lims.append("revlog.id < {}".format(id_stop))
+
+        lim = "WHERE " + " AND ".join(query_lims) if query_lims else ""
+
+        if localtime:
+            day = """\
+CAST(STRFTIME('%s', revlog.id / 1000 - {}, 'unixepoch',
+              'localtime', 'start of day') AS int)""".format(
+                offset * 3600
+            )
+        else:
+            day = bucketer.sql_day_expression("revlog.id")
+
+        cmd = """\
+SELECT {} AS day, cards.did, COUNT()
+FROM revlog LEFT JOIN cards ON cards.id = revlog.cid {}
+GROUP BY day, cards.did""".format(
+            day, lim
+        )
+
+        with instrumentation.phase("history query") as phase:
+            res = self._db.all(cmd)
+            if phase:
+                phase.rows = len(res)
+
+        if isDebuggingOn():
+            self.__debug_query(cmd, res)
+
+        if not localtime and (self._verify_day_bucketing or isDebuggingOn()):
+            self.__verify_rows(res, lims, offset, start, id_start, id_stop)
+
+        return res
+
+    def _day_bucketer(
+        self, offset: int, start: Optional[int] = None, stop: Optional[int] = None
+    ) -> DayBucketer:
+        """
+        start, stop: timestamps in seconds spanning the revlog entries to
+        bucket. Default to the first revlog entry and the current time.
+        """
+        if start is None:
+            start = (self._db.scalar("SELECT MIN(id) FROM revlog") or 0) // 1000
+        if stop is None:
+            stop = int(time.time())
+        return DayBucketer(start, stop, offset=offset)
+
+    def _revlog_covered(self, lims: List[str]) -> bool:
+        # Anki's index on revlog.cid covers unfiltered passes, the add-on's
+        # optional index also passes filtered by ease
+        return not lims or self._indexes.available("revlog")
+
+    # Forecast
+    #########################################################################
+
+    def _forecast(self, today: int) -> ActivityCube:
+        """
+        today: day timestamp of today
+
+        Group review and day-learning cards by due day and deck. Due days are
+        stored as scheduler day numbers, so we group on the plain integer
+        column and keep day numbers until days are read out of the cube.
+
+        Overdue cards and invalid due dates are excluded through a range on
+        the due column rather than after the fact, which both Anki's and the
+        add-on's index on cards can serve.
+        """
+        sched_today = self._col.sched.today
+        due_range = (sched_today, sched_today + MAX_FORECAST_DAYS)
+
+        if self._indexes.available("cards"):
+            # the add-on's (queue, due, did) index returns each queue's rows
+            # in group order, so no temporary b-tree is needed for grouping
+            cmd = """\
+SELECT due, did, COUNT() FROM cards
+WHERE queue = 2 AND due >= ? AND due < ? GROUP BY due, did
+UNION ALL
+SELECT due, did, COUNT() FROM cards
+WHERE queue = 3 AND due >= ? AND due < ? GROUP BY due, did"""
+            params = due_range * 2
+        else:
+            cmd = """\
+SELECT due, did, COUNT()
+FROM cards
+WHERE queue IN (2,3) AND due >= ? AND due < ?
+GROUP BY due, did"""
+            params = due_range
+
+        with instrumentation.phase("forecast query") as phase:
+            res = self._db.all(cmd, *params)
+            if phase:
+                phase.rows = len(res)
+
+        if isDebuggingOn():
+            self.__debug_query(cmd, res)
+
+        return ActivityCube.from_day_numbers(res, origin=today // 86400 - sched_today)
+
+    # Collection properties
+    #########################################################################
+
+    @property
+    def _day_cutoff(self) -> int:
+        """
+        Return unix epoch timestamp in seconds at which the current day ends
+        """
+        try:
+            return self._col.sched.day_cutoff
+        except AttributeError:
+            return self._col.sched.dayCutoff
+
+    # Activity store helpers
+    #########################################################################
+
+    def _store_fingerprint(self, lims: List[str], offset: int) -> str:
+        components = (
+            offset,
+            local_tz_fingerprint(),
+            getattr(self._col, "crt", None),
+            lims,
+        )
+        return hashlib.sha1(repr(components).encode("utf-8")).hexdigest()
+
+    def _revlog_rows_before(self, revlog_id: int) -> int:
+        # Counting the entire table allows SQLite to use its smallest index
+        # rather than reading all table pages. Entries past revlog_id are
+        # limited to the current day and quick to count via the primary key.
+        return self._db.scalar(
+            "SELECT (SELECT COUNT() FROM revlog) - "
+            "(SELECT COUNT() FROM revlog WHERE id >= ?)",
+            revlog_id,
+        )
+
+    def _reviewed_cards_signature(self) -> Tuple[float, ...]:
+        # probes ix_revlog_cid once per card
+        return tuple(
+            self._db.first(
+                """\
+SELECT COUNT(), TOTAL((id % 9973) * did) FROM cards
+WHERE EXISTS (SELECT 1 FROM revlog WHERE revlog.cid = cards.id)"""
+            )
+        )
+
+    # Debugging
+    #########################################################################
+
+    def __debug_query(self, cmd: str, res: List[Sequence[int]]):
+        logger.debug(cmd)
+        logger.debug(res)
+
+    def __verify_rows(
+        self,
+        res: List[Sequence[int]],
+        lims: List[str],
+        offset: int,
+        start: Optional[int],
+        id_start: Optional[int],
+        id_stop: Optional[int],
+    ):
+        expected = self._query_rows(
+            lims,
+            offset,
+            start=start,
+            id_start=id_start,
+            id_stop=id_stop,
+            localtime=True,
+        )
+        actual_set = set(map(tuple, res))
+        expected_set = set(map(tuple, expected))
+        if actual_set == expected_set:
+            return
+        mismatches = sorted(actual_set ^ expected_set, key=repr)
+        logger.error(
+            "Day bucketing does not match SQLite localtime grouping. "
+            "Timezone: %s, mismatched entries: %s",
+            local_tz_fingerprint(),
+            mismatches[:50],
+        )
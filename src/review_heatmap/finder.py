@@ -36,9 +36,8 @@ Finder extensions
 import re
 from typing import TYPE_CHECKING, List, Optional
 
-from aqt import mw
-
 if TYPE_CHECKING:
+    from anki.dbproxy import DBProxy
     from aqt.browser.table import SearchContext
 
 
@@ -46,10 +45,12 @@ if TYPE_CHECKING:
 # e.g. deck:current, which we actually add in the overview view
 
 
-def _find_cards_reviewed_between(start_date: int, end_date: int) -> List[int]:
+def _find_cards_reviewed_between(
+    db: "DBProxy", start_date: int, end_date: int
+) -> List[int]:
     # select from cards instead of just selecting uniques from revlog
     # in order to exclude deleted cards
-    return mw.col.db.list(  # type: ignore
+    return db.list(
         "SELECT id FROM cards where id in "
         "(SELECT cid FROM revlog where id between ? and ?)",
         start_date,
@@ -66,10 +67,14 @@ def find_rid(search: str) -> Optional[List[int]]:
     if not match:
         return None
 
+    from aqt import mw
+
     start_date = int(match[1])
     end_date = int(match[2])
 
-    return _find_cards_reviewed_between(start_date, end_date)
+    return _find_cards_reviewed_between(
+        mw.col.db, start_date, end_date  # type: ignore[union-attr]
+    )
 
 
 def on_browser_will_search(search_context: "SearchContext"):
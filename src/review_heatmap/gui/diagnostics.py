@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Diagnostics dialogs showing recent render timings, query plans, and the
+add-on's indexes
+"""
+
+from typing import Optional
+
+from aqt import mw
+from aqt.qt import QWidget
+
+from ..audit import audit_report_queries, auditor, plans_html
+from ..config import config
+from ..indexes import IndexManager, format_size, usage_html
+from ..instrumentation import instrumentation, traces_html
+from ..libaddon.gui.dialog_htmlview import HTMLViewer
+from .extra import count_reviews_today
+
+
+def invoke_diagnostics_dialog(parent: Optional[QWidget] = None):
+    # also write timings to the debug log, so that they are included when
+    # users share it
+    instrumentation.dump()
+    dialog = HTMLViewer(
+        traces_html(instrumentation.traces()),
+        title="Review Heatmap Render Timings",
+        parent=parent,
+    )
+    dialog.exec()
+
+
+def invoke_query_plans_dialog(parent: Optional[QWidget] = None):
+    if not mw.col:
+        return
+    try:
+        day_cutoff = mw.col.sched.day_cutoff
+    except AttributeError:
+        day_cutoff = mw.col.sched.dayCutoff
+    records = audit_report_queries(
+        mw.col,
+        [config],
+        extra_queries=[lambda db: count_reviews_today(db, day_cutoff)],
+    )
+    auditor.dump()
+    dialog = HTMLViewer(
+        plans_html(records), title="Review Heatmap Query Plans", parent=parent
+    )
+    dialog.exec()
+
+
+def invoke_indexes_dialog(parent: Optional[QWidget] = None):
+    if not mw.col:
+        return
+    usage = IndexManager(mw.col.db).usage()
+    total = sum(entry.size or 0 for entry in usage)
+    enabled = "enabled" if config["profile"]["indexes"] else "disabled"
+    html = "<p>Additional indexes are {} (Fine Tuning tab). {} on disk.</p>{}".format(
+        enabled, format_size(total), usage_html(usage)
+    )
+    dialog = HTMLViewer(html, title="Review Heatmap Indexes", parent=parent)
+    dialog.exec()
@@ -36,7 +36,7 @@ Extra dialogs
 
 import time
 from random import randrange
-from typing import Dict, Optional
+from typing import TYPE_CHECKING, Dict, Optional
 
 from aqt import mw
 from aqt.qt import (
@@ -59,6 +59,9 @@ from ..consts import ADDON
 from ..libaddon.anki.configmanager import ConfigManager
 from ..libaddon.platform import is_mac
 
+if TYPE_CHECKING:
+    from anki.dbproxy import DBProxy
+
 SNANKI_VERSION: str = "0.1.0"
 STARTING_LIVES: int = 3
 
@@ -309,21 +312,31 @@ defaults: Dict[str, Dict] = {
 snanki_config = ConfigManager(mw, config_dict=defaults, conf_key="snanki")
 
 
+def count_reviews_today(db: "DBProxy", day_cutoff: int) -> int:
+    return db.scalar(
+        """select count() from revlog where id > ?""",
+        (day_cutoff - 86400) * 1000,
+    )
+
+
 def invoke_snanki(parent: Optional[QWidget] = None):
     conf = snanki_config["profile"]
-    streak_max = getattr(mw, "_hmStreakMax", None)
-    streak_cur = getattr(mw, "_hmStreakCur", None)
-    activity_daily_avg = getattr(mw, "_hmActivityDailyAvg", None)
+
+    controller = getattr(mw, "_review_heatmap", None)
+    report = controller.stats.report if controller is not None else None
+    if report is not None:
+        streak_max = report.streak_max.value
+        streak_cur = report.streak_cur.value
+        activity_daily_avg = report.activity_daily_avg.value
+    else:
+        streak_max = streak_cur = activity_daily_avg = None
 
     try:
         day_cutoff = mw.col.sched.day_cutoff
     except AttributeError:
         day_cutoff = mw.col.sched.dayCutoff
 
-    done_today = mw.col.db.scalar(
-        """select count() from revlog where id > ?""",
-        (day_cutoff - 86400) * 1000,
-    )
+    done_today = count_reviews_today(mw.col.db, day_cutoff)
 
     if activity_daily_avg is not None:
         goal = max(1, int(round(activity_daily_avg / 2)))
@@ -36,7 +36,7 @@ Options dialog and associated components
 import time
 from typing import Optional
 
-from aqt.qt import QAction, QApplication, QWidget
+from aqt.qt import QAction, QApplication, QUrl, QWidget
 
 from anki.lang import _
 from aqt import mw
@@ -45,9 +45,22 @@ from aqt.studydeck import StudyDeck
 from ..config import config, heatmap_colors, heatmap_modes
 from ..libaddon.gui.dialog_options import OptionsDialog
 from ..libaddon.platform import PLATFORM
-from ..times import daystart_epoch
+from ..times import local_daystart
+from .diagnostics import (
+    invoke_diagnostics_dialog,
+    invoke_indexes_dialog,
+    invoke_query_plans_dialog,
+)
 from .forms import options as qtform_options
 
+HTML_DIAGNOSTICS_LINK = """\
+<ul>
+    <li><a href="action://diagnostics">Show render timings</a></li>
+    <li><a href="action://query-plans">Show query plans</a></li>
+    <li><a href="action://indexes">Show add-on indexes</a></li>
+</ul>\
+"""
+
 
 class RevHmOptions(OptionsDialog):
 
@@ -87,6 +100,8 @@ class RevHmOptions(OptionsDialog):
         ),
         ("form.cbLimDel", (("value", {"dataPath": "synced/limcdel"}),)),
         ("form.cbLimResched", (("value", {"dataPath": "synced/limresched"}),)),
+        ("form.cbAsyncRender", (("value", {"dataPath": "profile/asyncrender"}),)),
+        ("form.cbIndexes", (("value", {"dataPath": "profile/indexes"}),)),
         (
             "form.listDecks",
             (
@@ -131,6 +146,12 @@ class RevHmOptions(OptionsDialog):
                 font.setPointSize(int(default_size * 1.5))
                 label.setFont(font)
 
+    def _setupAbout(self):
+        super(RevHmOptions, self)._setupAbout()
+        htmlAbout = getattr(self.form, "htmlAbout", None)
+        if htmlAbout:
+            htmlAbout.append(HTML_DIAGNOSTICS_LINK)
+
     # Events:
 
     def _setupEvents(self):
@@ -140,6 +161,17 @@ class RevHmOptions(OptionsDialog):
 
     # Actions:
 
+    def _linkHandler(self, url):
+        if isinstance(url, QUrl):
+            url = url.toString()
+        if url == "action://diagnostics":
+            return invoke_diagnostics_dialog(parent=self)
+        elif url == "action://query-plans":
+            return invoke_query_plans_dialog(parent=self)
+        elif url == "action://indexes":
+            return invoke_indexes_dialog(parent=self)
+        return super(RevHmOptions, self)._linkHandler(url)
+
     # Deck list buttons
     # TODO: Migrate to custom widget
 
@@ -201,9 +233,8 @@ class RevHmOptions(OptionsDialog):
     # Config getters:
 
     def _getDateLimData(self, widget_val):
-        db = self.mw.col.db
-        val = daystart_epoch(db, widget_val)
-        default = daystart_epoch(db, self._setDateLimDataMin(None))
+        val = local_daystart(widget_val)
+        default = local_daystart(self._setDateLimDataMin(None))
         if val == default:
             return 0
         return widget_val
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Stand-in collection for generating reports outside of Anki
+
+Wraps an Anki collection file in the small subset of the Collection and
+DBProxy APIs used by ActivityReporter, times.daystart_epoch, and the
+finder, using nothing but the standard library. This allows reports to be
+generated, profiled, and benchmarked on a headless machine without
+importing aqt or starting Qt:
+
+    from review_heatmap.activity import ActivityReporter
+    from review_heatmap.headless import HeadlessCollection, headless_config
+
+    with HeadlessCollection("collection.anki2") as col:
+        reporter = ActivityReporter(col, headless_config(limresched=False))
+        report = reporter.get_report()
+
+Collections are opened read-only by default. Scheduling days are derived
+the way the v1 and v2 schedulers do it, which might differ from the Rust
+scheduler on days with DST transitions.
+"""
+
+import copy
+import datetime
+import json
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .defaults import config_defaults
+
+
+class HeadlessDB:
+    """
+    DBProxy replacement over a plain sqlite3 connection
+    """
+
+    def __init__(self, path: str, readonly: bool = True):
+        if readonly:
+            self._db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            self._db = sqlite3.connect(path)
+
+    def all(self, sql: str, *args: Any, **kwargs: Any) -> List[List[Any]]:
+        return [list(row) for row in self._db.execute(sql, kwargs or args)]
+
+    def first(self, sql: str, *args: Any, **kwargs: Any) -> Optional[List[Any]]:
+        row = self._db.execute(sql, kwargs or args).fetchone()
+        return list(row) if row is not None else None
+
+    def scalar(self, sql: str, *args: Any, **kwargs: Any) -> Any:
+        row = self._db.execute(sql, kwargs or args).fetchone()
+        return row[0] if row is not None else None
+
+    def list(self, sql: str, *args: Any, **kwargs: Any) -> List[Any]:
+        return [row[0] for row in self._db.execute(sql, kwargs or args)]
+
+    def execute(self, sql: str, *args: Any, **kwargs: Any) -> List[List[Any]]:
+        return self.all(sql, *args, **kwargs)
+
+    def executemany(self, sql: str, args: Sequence[Sequence[Any]]):
+        self._db.executemany(sql, args)
+
+    def commit(self):
+        self._db.commit()
+
+    def close(self):
+        self._db.close()
+
+
+class HeadlessDecks:
+    """
+    Read-only deck manager replacement
+    """
+
+    def __init__(self, names: Dict[int, str], current_id: int = 1):
+        self._names: Dict[int, str] = names
+        self._current_id: int = current_id
+
+    def all(self) -> List[Dict[str, Any]]:
+        return [{"id": did, "name": name} for did, name in self._names.items()]
+
+    def get_current_id(self) -> int:
+        return self._current_id
+
+    def current(self) -> Dict[str, Any]:
+        return {"id": self._current_id, "name": self._names.get(self._current_id)}
+
+    def name_if_exists(self, did: int) -> Optional[str]:
+        return self._names.get(did)
+
+    def children(self, did: int) -> List[Tuple[str, int]]:
+        """
+        All descendants of the given deck as (name, id) tuples
+        """
+        name = self._names.get(did)
+        if name is None:
+            return []
+        prefix = name + "::"
+        return [
+            (child_name, child_id)
+            for child_id, child_name in self._names.items()
+            if child_name.startswith(prefix)
+        ]
+
+    def deck_and_child_ids(self, did: int) -> List[int]:
+        return [did] + [child_id for _, child_id in self.children(did)]
+
+
+class HeadlessScheduler:
+    """
+    Day boundaries as computed by the v1 and v2 schedulers
+    """
+
+    def __init__(self, crt: int, rollover: Optional[int] = 4):
+        self._crt: int = crt
+        # v1 collections roll over at the hour of the collection's creation
+        self._rollover: Optional[int] = rollover
+
+    @property
+    def today(self) -> int:
+        if self._rollover is None:
+            return int((time.time() - self._crt) // 86400)
+        start = datetime.datetime.fromtimestamp(self._crt).replace(
+            hour=self._rollover_hour, minute=0, second=0, microsecond=0
+        )
+        return int((time.time() - time.mktime(start.timetuple())) // 86400)
+
+    @property
+    def day_cutoff(self) -> int:
+        if self._rollover is None:
+            return self._crt + (self.today + 1) * 86400
+        now = datetime.datetime.today()
+        cutoff = now.replace(
+            hour=self._rollover_hour, minute=0, second=0, microsecond=0
+        )
+        if cutoff < now:
+            cutoff += datetime.timedelta(days=1)
+        return int(time.mktime(cutoff.timetuple()))
+
+    @property
+    def _rollover_hour(self) -> int:
+        rollover = self._rollover or 0
+        return rollover + 24 if rollover < 0 else rollover
+
+
+class HeadlessCollection:
+    """
+    Read access to an Anki collection file, with the collection attributes
+    report components rely on (crt, conf, decks, sched, db)
+    """
+
+    def __init__(self, path: str, readonly: bool = True):
+        self.path: str = path
+        self.db: HeadlessDB = HeadlessDB(path, readonly=readonly)
+
+        crt, conf, decks = self.db.first("SELECT crt, conf, decks FROM col")
+        self.crt: int = crt
+        self.conf: Dict[str, Any] = self._load_conf(conf)
+        self.decks: HeadlessDecks = HeadlessDecks(
+            self._load_deck_names(decks), current_id=self.conf.get("curDeck", 1)
+        )
+        rollover = self.conf.get("rollover", 4) if self.sched_ver() >= 2 else None
+        self.sched: HeadlessScheduler = HeadlessScheduler(crt, rollover=rollover)
+
+    @property
+    def mod(self) -> int:
+        return self.db.scalar("SELECT mod FROM col")
+
+    def sched_ver(self) -> int:
+        return self.conf.get("schedVer", 1)
+
+    def v3_scheduler(self) -> bool:
+        return self.sched_ver() >= 2 and bool(self.conf.get("sched2021", False))
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self) -> "HeadlessCollection":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _load_conf(self, legacy_conf: str) -> Dict[str, Any]:
+        if not self._has_table("config"):  # schema 11
+            return json.loads(legacy_conf or "{}")
+        return {
+            key: json.loads(value)
+            for key, value in self.db.all("SELECT key, val FROM config")
+        }
+
+    def _load_deck_names(self, legacy_decks: str) -> Dict[int, str]:
+        if not self._has_table("decks"):  # schema 11
+            return {
+                int(did): deck["name"]
+                for did, deck in json.loads(legacy_decks or "{}").items()
+            }
+        # schema 15+ separates deck name components with \x1f
+        return {
+            did: name.replace("\x1f", "::")
+            for did, name in self.db.all("SELECT id, name FROM decks")
+        }
+
+    def _has_table(self, name: str) -> bool:
+        return bool(
+            self.db.scalar(
+                "SELECT COUNT() FROM sqlite_master WHERE type = 'table' AND name = ?",
+                name,
+            )
+        )
+
+
+def headless_config(**synced: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Default add-on configuration in place of the ConfigManager, with the
+    given synced settings (e.g. limdecks, limresched) overridden
+    """
+    config = copy.deepcopy(config_defaults)
+    unknown = set(synced) - set(config["synced"])
+    if unknown:
+        raise ValueError("Unknown settings: {}".format(", ".join(sorted(unknown))))
+    config["synced"].update(synced)
+    return config
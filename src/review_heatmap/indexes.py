@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Optional add-on-owned indexes on the revlog and cards tables
+
+Anki's own indexes do not cover the columns the report queries filter and
+group on, so on large collections the review history falls back to reading
+full revlog rows when manual reschedules are excluded. Users may opt into
+a small set of covering indexes. Their names share a common prefix, so that
+they can always be told apart from Anki's indexes and dropped again,
+including indexes created by earlier add-on versions.
+"""
+
+from html import escape
+from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Set, Tuple
+
+from .debug import logger
+
+if TYPE_CHECKING:
+    from anki.dbproxy import DBProxy
+
+INDEX_PREFIX = "ix_review_heatmap_"
+
+
+class AddonIndex(NamedTuple):
+    name: str
+    table: str
+    columns: Tuple[str, ...]
+
+    @property
+    def sql(self) -> str:
+        return "CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(
+            self.name, self.table, ", ".join(self.columns)
+        )
+
+
+ADDON_INDEXES: Tuple[AddonIndex, ...] = (
+    # Full history passes filtered by ease. Ordered by card id, so that the
+    # join on cards walks the cards table in order instead of at random.
+    AddonIndex(INDEX_PREFIX + "revlog_cid_ease", "revlog", ("cid", "ease", "id")),
+    # Forecast passes. Reading each queue separately yields rows in group
+    # order (cf. ReportEngine._forecast).
+    AddonIndex(INDEX_PREFIX + "cards_queue_due", "cards", ("queue", "due", "did")),
+)
+
+
+class IndexUsage(NamedTuple):
+    name: str
+    table: str
+    present: bool
+    size: Optional[int]  # bytes on disk, None if unknown
+
+
+class IndexManager:
+    """
+    Creates, inspects, and drops the add-on's indexes in a collection
+    """
+
+    def __init__(self, db: "DBProxy"):
+        self._db = db
+
+    def present(self) -> Set[str]:
+        """
+        Names of all add-on indexes currently in the database
+        """
+        return set(
+            self._db.list(
+                "SELECT name FROM sqlite_master WHERE type = 'index' "
+                "AND substr(name, 1, ?) = ?",
+                len(INDEX_PREFIX),
+                INDEX_PREFIX,
+            )
+        )
+
+    def missing(self) -> List[AddonIndex]:
+        present = self.present()
+        return [index for index in ADDON_INDEXES if index.name not in present]
+
+    def available(self, table: str) -> bool:
+        """
+        Whether the add-on's indexes on the given table are in place, i.e.
+        whether queries on it may be written with them in mind
+        """
+        present = self.present()
+        return any(
+            index.table == table and index.name in present for index in ADDON_INDEXES
+        )
+
+    def create(self) -> int:
+        """
+        Create any missing add-on indexes
+
+        Returns the number of bytes they added to the collection
+        """
+        missing = self.missing()
+        if not missing:
+            return 0
+        used = self._used_bytes()
+        for index in missing:
+            logger.debug("Creating index %s", index.name)
+            self._db.execute(index.sql)
+            # give the query planner statistics on the new index right away
+            # rather than after the next 'Check Database'
+            self._db.execute("ANALYZE {}".format(index.name))
+        return self._used_bytes() - used
+
+    def drop(self) -> int:
+        """
+        Drop all add-on indexes, including obsolete ones
+
+        Returns the number of bytes freed up (only returned to the file
+        system on the next 'Check Database')
+        """
+        present = self.present()
+        if not present:
+            return 0
+        used = self._used_bytes()
+        for name in sorted(present):
+            logger.debug("Dropping index %s", name)
+            self._db.execute("DROP INDEX IF EXISTS {}".format(name))
+        return used - self._used_bytes()
+
+    def usage(self) -> List[IndexUsage]:
+        """
+        Disk usage of all add-on indexes, both defined and left-over ones
+        """
+        present = self.present()
+        sizes = self._index_sizes()
+        usage = [
+            IndexUsage(
+                name=index.name,
+                table=index.table,
+                present=index.name in present,
+                size=sizes.get(index.name) if index.name in present else 0,
+            )
+            for index in ADDON_INDEXES
+        ]
+        defined = {index.name for index in ADDON_INDEXES}
+        for name in sorted(present - defined):
+            usage.append(IndexUsage(name, "", True, sizes.get(name)))
+        return usage
+
+    def _index_sizes(self) -> Dict[str, int]:
+        # the dbstat virtual table is an optional SQLite feature
+        try:
+            rows = self._db.all(
+                "SELECT name, SUM(pgsize) FROM dbstat "
+                "WHERE substr(name, 1, ?) = ? GROUP BY name",
+                len(INDEX_PREFIX),
+                INDEX_PREFIX,
+            )
+        except Exception as exception:
+            logger.debug("Could not measure index sizes: %s", exception)
+            return {}
+        return {name: size for name, size in rows}
+
+    def _used_bytes(self) -> int:
+        page_size, page_count, free_pages = (
+            self._db.scalar("PRAGMA page_size"),
+            self._db.scalar("PRAGMA page_count"),
+            self._db.scalar("PRAGMA freelist_count"),
+        )
+        return page_size * (page_count - free_pages)
+
+
+def format_size(size: Optional[int]) -> str:
+    if size is None:
+        return "unknown"
+    return "{:.1f} MB".format(size / (1024 * 1024))
+
+
+def usage_html(usage: List[IndexUsage]) -> str:
+    rows = []
+    for entry in usage:
+        if not entry.present:
+            status = "missing"
+        elif entry.table:
+            status = format_size(entry.size)
+        else:
+            status = "obsolete, {}".format(format_size(entry.size))
+        rows.append(
+            "<tr><td>{}</td><td>{}</td><td>{}</td></tr>".format(
+                escape(entry.name), escape(entry.table), status
+            )
+        )
+    header = "<tr><th>Index</th><th>Table</th><th>Size</th></tr>"
+    return "<table>{}{}</table>".format(header, "".join(rows))
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Lightweight timing instrumentation of the render pipeline
+
+Traces are only recorded while debugging is enabled, or when explicitly
+switched on. Otherwise, entering a trace or phase boils down to a flag check
+and returns a shared no-op object.
+
+Usage:
+
+    with instrumentation.trace("deckbrowser"):
+        ...
+        with instrumentation.phase("history query") as phase:
+            rows = db.all(cmd)
+            if phase:
+                phase.rows = len(rows)
+"""
+
+import threading
+import time
+from collections import deque
+from html import escape
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+from .debug import isDebuggingOn, logger
+
+
+class PhaseRecord(NamedTuple):
+    name: str
+    duration: float  # seconds
+    rows: Optional[int] = None  # number of rows or items processed
+    size: Optional[int] = None  # output size in bytes or characters
+
+
+class TraceRecord(NamedTuple):
+    label: str
+    started: float  # unix timestamp
+    duration: float  # seconds
+    phases: Tuple[PhaseRecord, ...]
+
+
+class _Phase:
+
+    __slots__ = ("_trace", "name", "rows", "size", "_start")
+
+    def __init__(self, trace: "_Trace", name: str):
+        self._trace = trace
+        self.name = name
+        self.rows: Optional[int] = None
+        self.size: Optional[int] = None
+
+    def __enter__(self) -> "_Phase":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._trace.phases.append(
+            PhaseRecord(
+                self.name, time.perf_counter() - self._start, self.rows, self.size
+            )
+        )
+
+
+class _NullPhase:
+    """
+    Stand-in for traces and phases while not recording. Falsy, so that
+    callers can skip gathering row counts and sizes.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullPhase":
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __bool__(self) -> bool:
+        return False
+
+
+_NULL_RECORDER = _NullPhase()
+
+
+class _Trace:
+
+    __slots__ = ("_instrumentation", "label", "phases", "_started", "_start")
+
+    def __init__(self, instrumentation: "Instrumentation", label: str):
+        self._instrumentation = instrumentation
+        self.label = label
+        self.phases: List[PhaseRecord] = []
+
+    def __enter__(self) -> "_Trace":
+        self._started = time.time()
+        self._start = time.perf_counter()
+        self._instrumentation._local.trace = self
+        return self
+
+    def __exit__(self, *exc_info):
+        self._instrumentation._local.trace = None
+        self._instrumentation._add(
+            TraceRecord(
+                label=self.label,
+                started=self._started,
+                duration=time.perf_counter() - self._start,
+                phases=tuple(self.phases),
+            )
+        )
+
+
+class Instrumentation:
+    """
+    Collects traces of the most recent renders and data requests in a ring
+    buffer. Each thread records into its own active trace, so background
+    reports are traced separately from the markup rendered on the main
+    thread.
+    """
+
+    def __init__(self, max_traces: int = 50):
+        self._traces: Deque[TraceRecord] = deque(maxlen=max_traces)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._enabled: Optional[bool] = None
+
+    @property
+    def enabled(self) -> bool:
+        if self._enabled is not None:
+            return self._enabled
+        return isDebuggingOn()
+
+    def set_enabled(self, enabled: Optional[bool]):
+        """
+        Record traces regardless of the debugging state (e.g. in benchmarks),
+        or follow it again if set to None
+        """
+        self._enabled = enabled
+
+    def trace(self, label: str):
+        """
+        Record phases entered on this thread under the given label. Nested
+        traces are folded into the outermost one.
+        """
+        if not self.enabled or getattr(self._local, "trace", None) is not None:
+            return _NULL_RECORDER
+        return _Trace(self, label)
+
+    def phase(self, name: str):
+        trace: Optional[_Trace] = getattr(self._local, "trace", None)
+        if trace is None:
+            return _NULL_RECORDER
+        return _Phase(trace, name)
+
+    def traces(self) -> List[TraceRecord]:
+        """
+        Recorded traces, oldest first
+        """
+        with self._lock:
+            return list(self._traces)
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+    def dump(self):
+        """
+        Write all recorded traces to the debug log
+        """
+        for record in self.traces():
+            logger.debug(format_trace(record))
+
+    def _add(self, record: TraceRecord):
+        with self._lock:
+            self._traces.append(record)
+
+
+def format_trace(record: TraceRecord) -> str:
+    lines = [
+        "{} at {}: {:.1f} ms".format(
+            record.label,
+            time.strftime("%H:%M:%S", time.localtime(record.started)),
+            record.duration * 1000,
+        )
+    ]
+    for phase in record.phases:
+        details = []
+        if phase.rows is not None:
+            details.append(f"{phase.rows} rows")
+        if phase.size is not None:
+            details.append(f"{phase.size} bytes")
+        lines.append(
+            "  {:<20} {:>8.1f} ms  {}".format(
+                phase.name, phase.duration * 1000, ", ".join(details)
+            ).rstrip()
+        )
+    return "\n".join(lines)
+
+
+def traces_html(records: List[TraceRecord]) -> str:
+    """
+    HTML summary of the given traces, most recent first
+    """
+    if not records:
+        return (
+            "<p>No render timings recorded, yet. Timings are only collected "
+            "while debugging is enabled.</p>"
+        )
+    return "".join(
+        "<pre>{}</pre>".format(escape(format_trace(record)))
+        for record in reversed(records)
+    )
+
+
+instrumentation = Instrumentation()
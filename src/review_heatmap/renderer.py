@@ -35,13 +35,14 @@ Heatmap and stats elements generation
 
 import json
 from enum import Enum
-from typing import TYPE_CHECKING, Dict, List, NamedTuple, Optional, Tuple
-
-from aqt.main import AnkiQt
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Tuple
 
 from .activity import ActivityReport, ActivityReporter, StatsEntry, StatsType
-from .config import heatmap_modes
-from .libaddon.platform import PLATFORM
+from .defaults import heatmap_modes
+from .engine import ChangeSignature
+from .environment import PLATFORM
+from .instrumentation import instrumentation
+from .stats_service import HeatmapStats
 from .web_content import (
     CSS_DISABLE_HEATMAP,
     CSS_DISABLE_STATS,
@@ -52,10 +53,15 @@ from .web_content import (
     HTML_HEATMAP,
     HTML_INFO_NODATA,
     HTML_MAIN_ELEMENT,
+    HTML_PLACEHOLDER,
     HTML_STREAK,
 )
+from .web_data import ActivityIndex
 
 if TYPE_CHECKING:
+    from anki.cards import Card
+    from aqt.main import AnkiQt
+
     from .libaddon.anki.configmanager import ConfigManager
 
 
@@ -75,11 +81,34 @@ class _StatsVisual(NamedTuple):
     unit: Optional[str]
 
 
+class RenderKey(NamedTuple):
+    """
+    Everything a rendered view depends on, apart from the collection state
+
+    deck_id: deck the view is limited to (current_deck_only), None otherwise
+    config: fingerprint of the add-on settings
+    """
+
+    view: HeatmapView
+    limhist: Optional[int]
+    limfcst: Optional[int]
+    current_deck_only: bool
+    deck_id: Optional[int]
+    config: str
+
+
 class _RenderCache(NamedTuple):
-    html: str
-    arguments: Tuple[HeatmapView, Optional[int], Optional[int], bool]
-    deck: int
-    col_mod: int
+    html: Optional[str]  # None if report was patched or not rendered yet
+    signature: ChangeSignature
+    report: ActivityReport
+    index: Optional[ActivityIndex] = None  # built on first page request
+
+
+class RenderCacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    size: int
+    max_size: int
 
 
 class HeatmapRenderer:
@@ -127,13 +156,23 @@ class HeatmapRenderer:
         4.0,
     )
 
-    def __init__(self, mw: AnkiQt, reporter: ActivityReporter, config: "ConfigManager"):
-        self._mw: AnkiQt = mw
+    _max_cache_entries: int = 16
+
+    def __init__(
+        self,
+        mw: "AnkiQt",
+        reporter: ActivityReporter,
+        config: "ConfigManager",
+        stats: Optional[HeatmapStats] = None,
+    ):
+        self._mw: "AnkiQt" = mw
         self._config: "ConfigManager" = config
         self._reporter: ActivityReporter = reporter
-        self._render_cache: Optional[_RenderCache] = None
-
-    # TODO: Consider caching on the render-level
+        self._stats: Optional[HeatmapStats] = stats
+        # least recently used entries first
+        self._render_cache: Dict[RenderKey, _RenderCache] = {}
+        self._cache_hits: int = 0
+        self._cache_misses: int = 0
 
     def render(
         self,
@@ -142,71 +181,199 @@ class HeatmapRenderer:
         limfcst: Optional[int] = None,
         current_deck_only: bool = False,
     ) -> str:
-        if self._render_cache and self._cache_still_valid(
-            view, limhist, limfcst, current_deck_only
-        ):
-            return self._render_cache.html
+        key = self.cache_key(view, limhist, limfcst, current_deck_only)
+        signature = self.change_signature()
 
-        prefs = self._config["profile"]
+        cached = self.cached(key, signature)
+        if cached is not None:
+            return cached
+
+        report = self.report(key, signature)
+
+        return self.render_report(report, key, signature)
 
-        report = self._reporter.get_report(
-            limhist=limhist, limfcst=limfcst, current_deck_only=current_deck_only
+    def cached(self, key: RenderKey, signature: ChangeSignature) -> Optional[str]:
+        """
+        signature: current change signature
+        """
+        entry = self._render_cache.pop(key, None)
+        if entry is None or entry.signature != signature:
+            self._cache_misses += 1
+            return None
+        # move to end, marking entry as most recently used
+        self._render_cache[key] = entry
+        self._cache_hits += 1
+        if entry.html is None:
+            return self.render_report(entry.report, key, entry.signature)
+        return entry.html
+
+    def report(
+        self, key: RenderKey, signature: ChangeSignature
+    ) -> Optional[ActivityReport]:
+        """
+        Gather activity data. Does not touch the UI, so it is safe to call
+        from background threads.
+
+        signature: change signature taken before calling this
+        """
+        return self._reporter.get_report(
+            limhist=key.limhist,
+            limfcst=key.limfcst,
+            current_deck_only=key.current_deck_only,
+            deck_id=key.deck_id,
+            signature=signature,
         )
+
+    def render_report(
+        self,
+        report: Optional[ActivityReport],
+        key: RenderKey,
+        signature: ChangeSignature,
+    ) -> str:
+        """
+        key: render key captured when the report was requested
+        signature: change signature taken before the report was computed
+        """
+        view, limhist, limfcst, current_deck_only, _, _ = key
+
         if report is None:
             return HTML_MAIN_ELEMENT.format(content=HTML_INFO_NODATA, classes="")
 
-        dynamic_legend = self._dynamic_legend(report.stats.activity_daily_avg.value)
-        stats_legend = self._stats_legend(dynamic_legend)
-        heatmap_legend = self._heatmap_legend(dynamic_legend)
+        prefs = self._config["profile"]
 
-        classes = self._get_css_classes(view)
+        with instrumentation.phase("markup") as phase:
+            dynamic_legend = self._dynamic_legend(report.stats.activity_daily_avg.value)
+            stats_legend = self._stats_legend(dynamic_legend)
 
-        if prefs["display"][view.name]:
-            heatmap = self._generate_heatmap_elm(
-                report, heatmap_legend, current_deck_only
-            )
-        else:
-            heatmap = ""
-            classes.append(CSS_DISABLE_HEATMAP)
+            classes = self._get_css_classes(view)
 
-        if prefs["display"][view.name] or prefs["statsvis"]:
-            stats = self._generate_stats_elm(report, stats_legend)
-        else:
-            stats = ""
-            classes.append(CSS_DISABLE_STATS)
+            if prefs["display"][view.name]:
+                heatmap = self._generate_heatmap_elm(
+                    view, limhist, limfcst, current_deck_only
+                )
+            else:
+                heatmap = ""
+                classes.append(CSS_DISABLE_HEATMAP)
+
+            if prefs["display"][view.name] or prefs["statsvis"]:
+                stats = self._generate_stats_elm(report, stats_legend)
+            else:
+                stats = ""
+                classes.append(CSS_DISABLE_STATS)
+
+            render = HTML_MAIN_ELEMENT.format(
+                content=heatmap + stats, classes=" ".join(classes)
+            )
+            if phase:
+                phase.size = len(render.encode("utf-8"))
 
-        if not current_deck_only:
-            self._save_current_perf(report)
+        self._share_stats(report, signature, limhist, current_deck_only)
 
-        render = HTML_MAIN_ELEMENT.format(
-            content=heatmap + stats, classes=" ".join(classes)
+        self._cache_entry(
+            key, _RenderCache(html=render, signature=signature, report=report)
         )
 
-        self._render_cache = _RenderCache(
-            html=render,
-            arguments=(view, limhist, limfcst, current_deck_only),
-            deck=self._mw.col.decks.current(),
-            col_mod=self._mw.col.mod,
+        return render
+
+    def change_signature(self) -> ChangeSignature:
+        return self._reporter.change_signature()
+
+    def record_review(
+        self,
+        card: "Card",
+        previous_signature: ChangeSignature,
+        previous_did: int,
+        previous_due: Optional[int] = None,
+    ):
+        """
+        Patch cached reports after the given card has been answered. Only
+        re-renders markup the next time each view is requested.
+
+        previous_signature: change signature right before the card was answered
+        previous_did: deck of the card before it was answered
+        previous_due: due day number of the card before it was answered, if it
+        was part of the forecast
+        """
+        signature = self._reporter.signature_after_review(
+            previous_signature, card, previous_did, previous_due
         )
+        deck_id = self._mw.col.decks.current()["id"]
+
+        for key, entry in list(self._render_cache.items()):
+            if entry.signature != previous_signature:
+                # already outdated before the card was answered
+                del self._render_cache[key]
+                continue
+            if key.current_deck_only and key.deck_id != deck_id:
+                # deck limits might have changed, let cache validation handle it
+                continue
+            report = self._reporter.patch_report(
+                entry.report,
+                card,
+                limhist=key.limhist,
+                limfcst=key.limfcst,
+                current_deck_only=key.current_deck_only,
+                previous_due=previous_due,
+            )
+            if report is None:
+                del self._render_cache[key]
+                continue
+            self._share_stats(report, signature, key.limhist, key.current_deck_only)
+            self._render_cache[key] = _RenderCache(
+                html=entry.html if report is entry.report else None,
+                signature=signature,
+                report=report,
+            )
 
-        return render
+    def render_placeholder(self, view: HeatmapView, placeholder_id: str) -> str:
+        """
+        Lightweight stand-in for the heatmap while data is being gathered
+        """
+        return HTML_MAIN_ELEMENT.format(
+            content=HTML_PLACEHOLDER.format(id=placeholder_id),
+            classes=" ".join(self._get_css_classes(view)),
+        )
 
     def set_activity_reporter(self, reporter: ActivityReporter):
         self._reporter = reporter
 
     def invalidate_cache(self):
-        self._render_cache = None
-
-    def _cache_still_valid(self, view, limhist, limfcst, current_deck_only) -> bool:
-        # FIXME: for 2.1.28+
-        cache = self._render_cache
-        if not cache:
-            return False
-        col_unchanged = self._mw.col.mod == cache.col_mod  # type: ignore
-        return (
-            col_unchanged
-            and (view, limhist, limfcst, current_deck_only) == cache.arguments  # type: ignore
-            and (not current_deck_only or cache.deck == self._mw.col.decks.current())
+        self._render_cache.clear()
+
+    def _cache_entry(self, key: RenderKey, entry: _RenderCache):
+        self._render_cache.pop(key, None)
+        while len(self._render_cache) >= self._max_cache_entries:
+            del self._render_cache[next(iter(self._render_cache))]
+        self._render_cache[key] = entry
+
+    def cache_info(self) -> RenderCacheInfo:
+        return RenderCacheInfo(
+            hits=self._cache_hits,
+            misses=self._cache_misses,
+            size=len(self._render_cache),
+            max_size=self._max_cache_entries,
+        )
+
+    def cache_key(
+        self,
+        view: HeatmapView,
+        limhist: Optional[int] = None,
+        limfcst: Optional[int] = None,
+        current_deck_only: bool = False,
+    ) -> RenderKey:
+        deck_id = self._mw.col.decks.current()["id"] if current_deck_only else None
+        return RenderKey(
+            view=view,
+            limhist=limhist,
+            limfcst=limfcst,
+            current_deck_only=current_deck_only,
+            deck_id=deck_id,
+            config=self._config_fingerprint(),
+        )
+
+    def _config_fingerprint(self) -> str:
+        return json.dumps(
+            (self._config["synced"], self._config["profile"]), sort_keys=True
         )
 
     def _get_css_classes(self, view: HeatmapView) -> List[str]:
@@ -219,9 +386,94 @@ class HeatmapRenderer:
         ]
         return classes
 
+    def heatmap_data(
+        self,
+        view: HeatmapView,
+        limhist: Optional[int] = None,
+        limfcst: Optional[int] = None,
+        current_deck_only: bool = False,
+        start: Optional[int] = None,
+        stop: Optional[int] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Heatmap options and activity data requested by the heatmap element
+        once it has loaded. Served from the render cache where possible.
+
+        start, stop: page of activity data to return (day timestamps in
+        seconds, stop exclusive). If not set, the options are returned
+        alongside the initial page around today.
+        """
+        key = self.cache_key(view, limhist, limfcst, current_deck_only)
+        entry = self._render_cache.get(key)
+        signature = self.change_signature()
+
+        if entry is not None and entry.signature == signature:
+            report, index = entry.report, entry.index
+            if index is None:
+                index = ActivityIndex(report.activity)
+                self._render_cache[key] = entry._replace(index=index)
+        else:
+            report = self.report(key, signature)
+            if report is None:
+                return None
+            index = ActivityIndex(report.activity)
+            # keep for subsequent page requests, markup is rendered on demand
+            entry = _RenderCache(
+                html=None, signature=signature, report=report, index=index
+            )
+            self._share_stats(report, signature, limhist, current_deck_only)
+            self._cache_entry(key, entry)
+
+        if start is not None and stop is not None:
+            with instrumentation.phase("data encoding"):
+                return {"data": index.encode(start, stop), "loaded": [start, stop]}
+
+        start, stop = self._initial_page(report)
+
+        with instrumentation.phase("data encoding"):
+            dynamic_legend = self._dynamic_legend(report.stats.activity_daily_avg.value)
+            heatmap_legend = self._heatmap_legend(dynamic_legend)
+
+            return {
+                "options": self._heatmap_options(
+                    report, heatmap_legend, current_deck_only
+                ),
+                "data": index.encode(start, stop),
+                "loaded": [start, stop],
+            }
+
+    def _initial_page(self, report: ActivityReport) -> Tuple[int, int]:
+        """
+        Date range covering the domains shown around today, plus one page of
+        domains in each direction (cf. ReviewHeatmap.create)
+        """
+        mode = heatmap_modes[self._config["synced"]["mode"]]
+        if mode["domain"] == "year":
+            page_days = 366 * mode["range"]
+        else:
+            page_days = 31 * mode["range"]
+        today = report.today // 1000
+        return today - 2 * page_days * 86400, today + 2 * page_days * 86400
+
     def _generate_heatmap_elm(
-        self, report: ActivityReport, dynamic_legend, current_deck_only: bool
+        self,
+        view: HeatmapView,
+        limhist: Optional[int],
+        limfcst: Optional[int],
+        current_deck_only: bool,
     ) -> str:
+        # activity data is fetched through the bridge, keeping markup small
+        request = {
+            "view": view.name,
+            "limhist": limhist,
+            "limfcst": limfcst,
+            "current_deck_only": current_deck_only,
+        }
+        return HTML_HEATMAP.format(request=json.dumps(request))
+
+    def _heatmap_options(
+        self, report: ActivityReport, dynamic_legend, current_deck_only: bool
+    ) -> Dict[str, Any]:
         mode = heatmap_modes[self._config["synced"]["mode"]]
 
         # TODO: pass on "whole" to govern browser link "deck:current" addition
@@ -238,9 +490,7 @@ class HeatmapRenderer:
             "whole": not current_deck_only,
         }
 
-        return HTML_HEATMAP.format(
-            options=json.dumps(options), data=json.dumps(report.activity)
-        )
+        return options
 
     def _generate_stats_elm(self, data: ActivityReport, dynamic_legend) -> str:
         dynamic_levels = self._get_dynamic_levels(dynamic_legend)
@@ -292,15 +542,14 @@ class HeatmapRenderer:
     def _maybe_pluralize(count: float, term: str) -> str:
         return "{} {}{}".format(str(count), term, "s" if abs(count) > 1 else "")
 
-    def _save_current_perf(self, activity_report: ActivityReport):
-        """
-        Store current performance in mw object
-
-        TODO: Make data like this available through a proper API
-
-        Just a quick hack that allows us to assess user performance from
-        other distant parts of the code / other add-ons
-        """
-        self._mw._hmStreakMax = activity_report.stats.streak_max.value  # type: ignore
-        self._mw._hmStreakCur = activity_report.stats.streak_cur.value  # type: ignore
-        self._mw._hmActivityDailyAvg = activity_report.stats.activity_daily_avg.value  # type: ignore
+    def _share_stats(
+        self,
+        report: ActivityReport,
+        signature: ChangeSignature,
+        limhist: Optional[int],
+        current_deck_only: bool,
+    ):
+        # only reports matching the main screen's scope are stats-worthy
+        if self._stats is None or current_deck_only or limhist is not None:
+            return
+        self._stats.update(report, signature)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Vectorized computation of activity statistics
+"""
+
+from array import array
+from itertools import accumulate
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # numpy is not part of Anki's standard distribution
+    np = None
+
+_DAY = 86400
+
+
+class WindowStats(NamedTuple):
+    days: int  # number of days in window
+    days_active: int  # number of days with activity
+    total: int  # total activity count
+    daily_avg: int  # average count on days with activity
+    pct_days_active: int  # percentage of days with activity
+
+
+class ActivityStats:
+    """
+    Streaks, totals, averages and active-day percentages of a review history
+
+    The history is laid out as a contiguous per-day array spanning the first
+    recorded day up to today. Streaks are derived from a run-length encoding
+    of active days, windowed statistics from prefix sums over counts and
+    active days, so that any range can be evaluated in constant time once
+    the arrays are built.
+    """
+
+    def __init__(self, history: Sequence[Sequence[int]], today: int):
+        """
+        history: [[int, int]**]: sorted day timestamps (seconds), counts
+        today: day timestamp of today
+        """
+        self._today_index: int = today // _DAY
+        self._first: int = history[0][0] // _DAY if history else self._today_index
+        self._last_active: Optional[int] = history[-1][0] // _DAY if history else None
+
+        last = max(self._today_index, self._last_active or self._today_index)
+        length = last - self._first + 1
+
+        indices = [day // _DAY - self._first for day, _ in history]
+        counts = [count for _, count in history]
+
+        self._count_sums: Sequence[int]
+        self._active_sums: Sequence[int]
+        runs: Sequence[int]
+
+        if np is not None:
+            self._count_sums, self._active_sums, runs = _prefix_sums_numpy(
+                indices, counts, length
+            )
+        else:
+            self._count_sums, self._active_sums, runs = _prefix_sums_python(
+                indices, counts, length
+            )
+
+        today_index = self._today_index
+        self.streak_max: int = int(max(runs)) if len(runs) else 0
+        self.streak_cur: int = 0
+        if len(runs) and self._last_active in (today_index, today_index - 1):
+            # last recorded date today or yesterday?
+            self.streak_cur = int(runs[-1])
+
+    def add_today(self, count: int) -> bool:
+        """
+        Account for additional activity today in constant time
+
+        Returns False if the history extends past today, in which case the
+        stats need to be rebuilt instead.
+        """
+        today_index = self._today_index
+        if len(self._count_sums) - 1 != today_index - self._first + 1:
+            return False
+
+        if self._last_active != today_index:
+            self._active_sums[-1] += 1
+            self.streak_cur += 1
+            self.streak_max = max(self.streak_max, self.streak_cur)
+            self._last_active = today_index
+
+        self._count_sums[-1] += count
+
+        return True
+
+    # Whole-history stats
+
+    @property
+    def total(self) -> int:
+        return int(self._count_sums[-1])
+
+    @property
+    def days_active(self) -> int:
+        return int(self._active_sums[-1])
+
+    @property
+    def daily_avg(self) -> int:
+        """
+        Average count on days with activity
+        """
+        return int(round(self.total / max(self.days_active, 1)))
+
+    @property
+    def pct_days_active(self) -> int:
+        """
+        Percentage of days with activity, counting from first recorded day
+
+        NOTE: days_total is based on first recorded revlog entry, i.e. it is
+        not the grand total of days since collection creation date / whatever
+        history limits the user might have set. This value seems more
+        desirable and motivating than the raw percentage of days learned
+        in the date inclusion period.
+        """
+        days_total = self._today_index - self._first + 1
+        if days_total == 1:
+            return 100  # review history only extends to yesterday
+        return int(round((self.days_active / days_total) * 100))
+
+    # Windowed stats
+
+    def window(self, days: int) -> WindowStats:
+        """
+        Stats for the last number of days, including today
+        """
+        stop = (self._today_index + 1) * _DAY
+        return self.range(stop - days * _DAY, stop)
+
+    def range(self, start: int, stop: int) -> WindowStats:
+        """
+        Stats for days between timestamps start (inclusive) and stop
+        (exclusive)
+        """
+        days = max(-(-stop // _DAY) - -(-start // _DAY), 0)
+        low, high = self._clamp(start), self._clamp(stop)
+        total = int(self._count_sums[high] - self._count_sums[low])
+        days_active = int(self._active_sums[high] - self._active_sums[low])
+        return WindowStats(
+            days=days,
+            days_active=days_active,
+            total=total,
+            daily_avg=int(round(total / max(days_active, 1))),
+            pct_days_active=int(round(days_active / days * 100)) if days else 0,
+        )
+
+    def _clamp(self, timestamp: int) -> int:
+        index = -(-timestamp // _DAY) - self._first
+        return min(max(index, 0), len(self._count_sums) - 1)
+
+
+def _prefix_sums_numpy(
+    indices: List[int], counts: List[int], length: int
+) -> Tuple[Sequence[int], Sequence[int], Sequence[int]]:
+    daily = np.zeros(length, dtype=np.int64)
+    daily[indices] = counts
+    active = (daily > 0).astype(np.int64)
+
+    count_sums = np.concatenate(([0], np.cumsum(daily)))
+    active_sums = np.concatenate(([0], np.cumsum(active)))
+
+    # run-length encoding of active days
+    edges = np.diff(np.concatenate(([0], active, [0])))
+    runs = np.flatnonzero(edges == -1) - np.flatnonzero(edges == 1)
+
+    return count_sums, active_sums, runs
+
+
+def _prefix_sums_python(
+    indices: List[int], counts: List[int], length: int
+) -> Tuple[Sequence[int], Sequence[int], Sequence[int]]:
+    daily = array("q", bytes(8 * length))
+    active = array("q", bytes(8 * length))
+    for index, count in zip(indices, counts):
+        daily[index] = count
+        active[index] = 1 if count > 0 else 0
+
+    count_sums = array("q", [0])
+    count_sums.extend(accumulate(daily))
+    active_sums = array("q", [0])
+    active_sums.extend(accumulate(active))
+
+    # run-length encoding of gaps between active days
+    runs: List[int] = []
+    previous = None
+    for index, count in zip(indices, counts):
+        if count <= 0:
+            continue
+        if previous is not None and index - previous == 1:
+            runs[-1] += 1
+        else:
+            runs.append(1)
+        previous = index
+
+    return count_sums, active_sums, runs
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Cached, collection-wide review statistics for other parts of the add-on
+and third-party add-ons
+"""
+
+import json
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+
+from .debug import logger
+
+if TYPE_CHECKING:
+    from .activity import ActivityReport, ActivityReporter, StatsReport
+    from .engine import ChangeSignature
+    from .libaddon.anki.configmanager import ConfigManager
+
+StatsSubscriber = Callable[["HeatmapStats"], None]
+
+
+class HeatmapStats:
+    """
+    Streaks and averages of the review history shown on the main screen,
+    i.e. all non-excluded decks within the configured history limits
+
+    Values are computed lazily on first access and cached until reviews,
+    card schedules, the day, or the synced heatmap settings change. Reports
+    rendered or patched by the heatmap are adopted as they are produced,
+    so most requests are answered without running any queries beyond the
+    change probe.
+
+    Other add-ons can reach the service through mw._review_heatmap.stats
+    and subscribe to be notified whenever the stats change.
+    """
+
+    def __init__(
+        self,
+        reporter_provider: Callable[[], "ActivityReporter"],
+        config: "ConfigManager",
+    ):
+        self._reporter_provider = reporter_provider
+        self._config: "ConfigManager" = config
+        self._stats: Optional["StatsReport"] = None
+        self._key: Optional[Tuple["ChangeSignature", str]] = None
+        self._subscribers: List[StatsSubscriber] = []
+
+    @property
+    def report(self) -> Optional["StatsReport"]:
+        """
+        Current stats, or None if there is no review history
+
+        Each access probes for changes, so read this once when querying
+        several values.
+        """
+        reporter = self._reporter_provider()
+        signature = reporter.change_signature()
+        key = (signature, self._config_fingerprint())
+        if key != self._key:
+            activity_report = reporter.get_report(signature=signature)
+            self._set(activity_report.stats if activity_report else None, key)
+        return self._stats
+
+    @property
+    def streak_max(self) -> Optional[int]:
+        stats = self.report
+        return stats.streak_max.value if stats else None
+
+    @property
+    def streak_cur(self) -> Optional[int]:
+        stats = self.report
+        return stats.streak_cur.value if stats else None
+
+    @property
+    def pct_days_active(self) -> Optional[int]:
+        stats = self.report
+        return stats.pct_days_active.value if stats else None
+
+    @property
+    def activity_daily_avg(self) -> Optional[int]:
+        stats = self.report
+        return stats.activity_daily_avg.value if stats else None
+
+    def update(self, report: Optional["ActivityReport"], signature: "ChangeSignature"):
+        """
+        Adopt stats of a collection-wide report computed elsewhere
+        """
+        stats = report.stats if report else None
+        self._set(stats, (signature, self._config_fingerprint()))
+
+    def invalidate(self):
+        """
+        Recompute on next access, e.g. after switching collections
+        """
+        self._key = None
+
+    def subscribe(self, callback: StatsSubscriber):
+        """
+        Call callback with this service whenever the stats change
+        """
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: StatsSubscriber):
+        try:
+            self._subscribers.remove(callback)
+        except ValueError:
+            pass
+
+    def _set(self, stats: Optional["StatsReport"], key: Tuple["ChangeSignature", str]):
+        changed = stats != self._stats
+        self._stats = stats
+        self._key = key
+        if not changed:
+            return
+        for callback in list(self._subscribers):
+            try:
+                callback(self)
+            except Exception:
+                logger.exception("Stats subscriber %r failed", callback)
+
+    def _config_fingerprint(self) -> str:
+        # deck exclusions and history limits are the only settings that
+        # affect collection-wide stats
+        return json.dumps(self._config["synced"], sort_keys=True)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Persistent storage of aggregated review activity
+"""
+
+import json
+import os
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+from .debug import logger
+
+# Bump whenever the on-disk format or the semantics of stored day buckets change
+STORE_VERSION = 2
+
+# Deck activity keyed by deck ID (None for deleted cards), then by day
+DeckActivity = Dict[Optional[int], Dict[int, int]]
+
+
+class StoreEntry:
+    """
+    Per-deck, per-day review counts for a single set of report filters
+
+    checkpoint: revlog id (epoch ms) up to which (exclusive) entries have
+                been folded into activity
+    rows:       total number of revlog entries below checkpoint at the time
+                of the last ingestion. Used to detect entries that were added
+                or removed retroactively (e.g. through syncing or importing)
+    cards:      cards table signature at the time of the last ingestion
+    reviewed:   count and deck assignment checksum of cards with review
+                history, used to detect card deletions and changed deck
+                assignments. Only compared when cards changed, as it takes
+                a pass over revlog to compute.
+    activity:   deck ID -> day start timestamp (seconds) -> review count
+    """
+
+    __slots__ = ("checkpoint", "rows", "cards", "reviewed", "activity")
+
+    def __init__(
+        self,
+        checkpoint: int = 0,
+        rows: int = 0,
+        cards: Optional[Tuple[float, ...]] = None,
+        reviewed: Optional[Tuple[float, ...]] = None,
+        activity: Optional[DeckActivity] = None,
+    ):
+        self.checkpoint: int = checkpoint
+        self.rows: int = rows
+        self.cards: Optional[Tuple[float, ...]] = cards
+        self.reviewed: Optional[Tuple[float, ...]] = reviewed
+        self.activity: DeckActivity = activity if activity is not None else {}
+
+    def fold(self, history: Iterable[Sequence[Optional[int]]]):
+        """
+        Fold (day, did, count) rows into stored activity
+        """
+        fold_deck_activity(self.activity, history)
+
+    def serialize(self) -> dict:
+        return {
+            "checkpoint": self.checkpoint,
+            "rows": self.rows,
+            "cards": list(self.cards) if self.cards is not None else None,
+            "reviewed": list(self.reviewed) if self.reviewed is not None else None,
+            "activity": [
+                [did, sorted(days.items())] for did, days in self.activity.items()
+            ],
+        }
+
+    @classmethod
+    def deserialize(cls, data: dict) -> "StoreEntry":
+        cards = data.get("cards")
+        reviewed = data.get("reviewed")
+        return cls(
+            checkpoint=data["checkpoint"],
+            rows=data["rows"],
+            cards=tuple(cards) if cards is not None else None,
+            reviewed=tuple(reviewed) if reviewed is not None else None,
+            activity={
+                did: {int(day): int(count) for day, count in days}
+                for did, days in data["activity"]
+            },
+        )
+
+
+def fold_deck_activity(activity: DeckActivity, rows: Iterable[Sequence[Optional[int]]]):
+    for day, did, count in rows:
+        days = activity.get(did)
+        if days is None:
+            days = activity[did] = {}
+        days[day] = days.get(day, 0) + count  # type: ignore[index, operator]
+
+
+class ActivityStore:
+    """
+    Add-on-owned store of per-day revlog aggregates
+
+    Entries are keyed by a fingerprint of everything that affects day
+    assignment and row inclusion (day rollover, timezone, reschedule
+    filter). Only a handful of fingerprints are kept around in
+    order to cover the different views without growing unbounded.
+    """
+
+    _max_entries: int = 8
+
+    def __init__(self, path: Optional[str] = None):
+        self._path: Optional[str] = path
+        self._entries: Dict[str, StoreEntry] = {}
+        self._load()
+
+    def get(self, fingerprint: str) -> Optional[StoreEntry]:
+        entry = self._entries.get(fingerprint)
+        if entry is not None:
+            # move to end, marking entry as most recently used
+            self._entries[fingerprint] = self._entries.pop(fingerprint)
+        return entry
+
+    def reset(
+        self,
+        fingerprint: str,
+        cards: Optional[Tuple[float, ...]] = None,
+        reviewed: Optional[Tuple[float, ...]] = None,
+    ) -> StoreEntry:
+        self._entries.pop(fingerprint, None)
+        while len(self._entries) >= self._max_entries:
+            del self._entries[next(iter(self._entries))]
+        entry = self._entries[fingerprint] = StoreEntry(cards=cards, reviewed=reviewed)
+        return entry
+
+    def clear(self):
+        self._entries.clear()
+        self.save()
+
+    def save(self):
+        if not self._path:
+            return
+        data = {
+            "version": STORE_VERSION,
+            "entries": {
+                fingerprint: entry.serialize()
+                for fingerprint, entry in self._entries.items()
+            },
+        }
+        tmp_path = self._path + ".tmp"
+        try:
+            directory = os.path.dirname(self._path)
+            if directory:  # relative paths without directory components
+                os.makedirs(directory, exist_ok=True)
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self._path)
+        except OSError as e:
+            logger.error("Could not write activity store: %s", e)
+
+    def _load(self):
+        if not self._path or not os.path.exists(self._path):
+            return
+        try:
+            with open(self._path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != STORE_VERSION:
+                return
+            self._entries = {
+                fingerprint: StoreEntry.deserialize(entry)
+                for fingerprint, entry in data["entries"].items()
+            }
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            # corrupted or incompatible store, start from scratch
+            logger.error("Could not read activity store: %s", e)
+            self._entries = {}
@@ -33,7 +33,10 @@
 Shared datetime/timezone handling
 """
 
-from typing import Union, TYPE_CHECKING
+import time
+from bisect import bisect_right
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
 
 if TYPE_CHECKING:
     from anki.dbproxy import DBProxy
@@ -47,6 +50,9 @@ def daystart_epoch(
 ) -> int:
     """
     Convert strftime date string into unix timestamp of 00:00 UTC
+
+    Queries the database on each call. Mostly superseded by local_daystart,
+    but kept as the reference implementation to verify the latter against.
     """
     # Use db query instead of Python time-related modules to guarantee
     # consistency with rest of activity data (also: Anki does not seem
@@ -62,3 +68,185 @@ SELECT CAST(STRFTIME('%s', '{time_specifier}', {unixepoch} {offset}
         time_specifier=time_specifier, unixepoch=unixepoch, offset=offset_str
     )
     return db.scalar(cmd)
+
+
+def local_tz_fingerprint() -> str:
+    """
+    Return a short string identifying the local timezone and its DST rules
+    """
+    return "{}|{}|{}|{}".format(
+        time.timezone, time.altzone, time.daylight, "/".join(time.tzname)
+    )
+
+
+# Day bucketing
+######################################################################
+
+# Step size used when scanning for UTC offset transitions. Zones do not
+# change their offset more than once per day
+_TRANSITION_SCAN_STEP = 86400
+
+
+def utc_offset(timestamp: int) -> int:
+    """
+    Return local UTC offset in seconds at given unix timestamp
+    """
+    return time.localtime(timestamp).tm_gmtoff
+
+
+@lru_cache(maxsize=8)
+def utc_offset_transitions(
+    start: int, stop: int, tz_fingerprint: str
+) -> Tuple[Tuple[int, int], ...]:
+    """
+    Return local UTC offset transition table for given time span as a tuple
+    of (timestamp, offset) pairs, with each offset applying from its
+    timestamp onwards (inclusive). The first offset also applies to all
+    times before start, the last one to all times after stop.
+
+    tz_fingerprint is only used to invalidate cached tables in case the
+    local timezone changes.
+    """
+    return _scan_utc_offset_transitions(start, stop)
+
+
+def _scan_utc_offset_transitions(start: int, stop: int) -> Tuple[Tuple[int, int], ...]:
+    current = utc_offset(start)
+    transitions: List[Tuple[int, int]] = [(start, current)]
+
+    timestamp = start
+    while timestamp < stop:
+        next_timestamp = min(timestamp + _TRANSITION_SCAN_STEP, stop)
+        offset = utc_offset(next_timestamp)
+        if offset != current:
+            # bisect for first second with new offset
+            low, high = timestamp, next_timestamp
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(middle) == current:
+                    low = middle
+                else:
+                    high = middle
+            transitions.append((high, offset))
+            current = offset
+        timestamp = next_timestamp
+
+    return tuple(transitions)
+
+
+# Single day starts
+######################################################################
+
+
+@lru_cache(maxsize=64)
+def _utc_day_offsets(day: int, tz_fingerprint: str) -> Tuple[Tuple[int, int], ...]:
+    """
+    UTC offset transition table of given UTC day (days since epoch)
+    """
+    start = day * 86400
+    return _scan_utc_offset_transitions(start, start + 86400)
+
+
+def local_daystart(timestamp: Optional[int] = None, offset: int = 0) -> int:
+    """
+    Return unix timestamp of 00:00 UTC of the local date at the given unix
+    timestamp in seconds (default: now), with days starting offset hours
+    past midnight. Equivalent to
+
+        STRFTIME('%s', timestamp, 'unixepoch', '-{offset} hours',
+                 'localtime', 'start of day')
+
+    as evaluated by daystart_epoch, but without a database round trip. Like
+    SQLite, this relies on the C library's local time conversion. The UTC
+    offsets in effect are memoized per UTC day, so that repeated calls only
+    come down to a few integer operations.
+
+    Note that SQLite maps years outside of 1971-2037 onto an equivalent
+    year before converting to local time, so results may differ there.
+    """
+    if timestamp is None:
+        timestamp = int(time.time())
+    shifted = int(timestamp) - offset * 3600
+    transitions = _utc_day_offsets(shifted // 86400, local_tz_fingerprint())
+    utc_offset = transitions[0][1]
+    for threshold, transition_offset in transitions[1:]:
+        if shifted >= threshold:
+            utc_offset = transition_offset
+    local = shifted + utc_offset
+    return local - local % 86400
+
+
+class DayBucketer:
+    """
+    Assigns unix timestamps to local days, returning the unix timestamp of
+    00:00 UTC of the local date, i.e. the equivalent of
+
+        STRFTIME('%s', timestamp - offset, 'unixepoch', 'localtime',
+                 'start of day')
+
+    Instead of consulting the C library for every single timestamp, the
+    local UTC offset transition table (i.e. DST boundaries) is computed once
+    for the covered time span. Assigning a day then comes down to integer
+    arithmetic, both in Python and in SQL.
+    """
+
+    def __init__(self, start: int, stop: int, offset: int = 0):
+        """
+        start, stop: unix timestamps in seconds spanning the data to bucket
+        offset: day rollover offset in hours
+        """
+        self._offset: int = offset * 3600
+        # transitions are looked up by timestamps shifted by the day rollover.
+        # Pad and align span to whole days to improve cache hits.
+        span_start = start - self._offset - 86400
+        span_stop = stop - self._offset + 2 * 86400
+        self._transitions: Tuple[Tuple[int, int], ...] = utc_offset_transitions(
+            span_start - span_start % 86400,
+            span_stop - span_stop % 86400,
+            local_tz_fingerprint(),
+        )
+        self._thresholds: List[int] = [t[0] for t in self._transitions]
+
+    @property
+    def transitions(self) -> Tuple[Tuple[int, int], ...]:
+        return self._transitions
+
+    def day_start(self, timestamp: int) -> int:
+        shifted = timestamp - self._offset
+        index = max(bisect_right(self._thresholds, shifted) - 1, 0)
+        local = shifted + self._transitions[index][1]
+        return local - local % 86400
+
+    def first_timestamp(self, day: int) -> int:
+        """
+        Return lower bound for the unix timestamps assigned to given day or
+        any of the days following it
+        """
+        max_utc_offset = max(t[1] for t in self._transitions)
+        return day + self._offset - max_utc_offset
+
+    def sql_day_expression(self, column: str = "id") -> str:
+        """
+        SQL expression assigning revlog-style ids (epoch milliseconds) in
+        column to local days
+        """
+        return "(({column} / 1000 - {offset} + {utc_offset}) / 86400) * 86400".format(
+            column=column,
+            offset=self._offset,
+            utc_offset=self._sql_offset_case(column, 0, len(self._transitions)),
+        )
+
+    def _sql_offset_case(self, column: str, low: int, high: int) -> str:
+        # balanced binary CASE tree over the transition table, keeping the
+        # number of comparisons per row logarithmic
+        if high - low == 1:
+            return str(self._transitions[low][1])
+        middle = (low + high) // 2
+        # shifted < t  <=>  column < (t + offset) * 1000 for integer columns
+        threshold = (self._transitions[middle][0] + self._offset) * 1000
+        return "CASE WHEN {column} < {threshold} THEN {lower} ELSE {upper} END".format(
+            column=column,
+            threshold=threshold,
+            lower=self._sql_offset_case(column, low, middle),
+            upper=self._sql_offset_case(column, middle, high),
+        )
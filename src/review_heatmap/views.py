@@ -78,7 +78,9 @@ class DeckBrowserInjector(HeatmapInjector):
     def on_deckbrowser_will_render_content(
         self, deck_browser: DeckBrowser, content: "DeckBrowserContent"
     ):
-        heatmap_html = self._controller.render_for_view(self._view)
+        heatmap_html = self._controller.render_for_view(
+            self._view, web=deck_browser.web
+        )
         content.stats += heatmap_html
 
 
@@ -110,7 +112,7 @@ class OverviewInjector(HeatmapInjector):
         self, overview: Overview, content: "OverviewContent"
     ):
         heatmap_html = self._controller.render_for_view(
-            self._view, current_deck_only=True
+            self._view, current_deck_only=True, web=overview.web
         )
         content.table += heatmap_html
 
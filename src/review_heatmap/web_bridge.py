@@ -33,6 +33,7 @@
 JS <-> PY communication
 """
 
+import json
 from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, Type, Union
 
 import aqt
@@ -46,12 +47,21 @@ from .config import heatmap_colors, heatmap_modes
 from .gui.contrib import invoke_contributions_dialog
 from .gui.extra import invoke_snanki
 from .gui.options import invoke_options_dialog
+from .renderer import HeatmapView
 
 if TYPE_CHECKING:
+    from aqt.webview import AnkiWebView
+
     from .libaddon.anki.configmanager import ConfigManager
 
 HANDLED_TYPE = Tuple[bool, Any]
 SUPPORTED_CONTEXT_TYPES = Union[DeckBrowser, Overview, DeckStats]
+# view, limhist, limfcst, current_deck_only, page start, page stop
+# -> heatmap options and data
+DATA_PROVIDER_TYPE = Callable[
+    [HeatmapView, Optional[int], Optional[int], bool, Optional[int], Optional[int]],
+    Optional[Dict[str, Any]],
+]
 
 
 class HeatmapBridge:
@@ -67,10 +77,17 @@ class HeatmapBridge:
         DeckStats,
     )
 
-    def __init__(self, mw: AnkiQt, config: "ConfigManager"):
+    def __init__(
+        self,
+        mw: AnkiQt,
+        config: "ConfigManager",
+        data_provider: Optional[DATA_PROVIDER_TYPE] = None,
+    ):
         self._mw: AnkiQt = mw
         self._config: "ConfigManager" = config
-        self._command_handler: _CommandHandler = _CommandHandler(mw, config)
+        self._command_handler: _CommandHandler = _CommandHandler(
+            mw, config, data_provider
+        )
 
     def register(self):
         from aqt.gui_hooks import webview_did_receive_js_message
@@ -97,6 +114,14 @@ class HeatmapBridge:
 
         return self._handle_message(url, context)
 
+    def push_render(self, web: "AnkiWebView", placeholder_id: str, html: str):
+        """Replace a placeholder in the given web view with rendered heatmap HTML"""
+        web.eval(
+            "ReviewHeatmap.inject({}, {});".format(
+                json.dumps(placeholder_id), json.dumps(html)
+            )
+        )
+
     def _handle_message(self, message: str, context: SUPPORTED_CONTEXT_TYPES) -> Any:
         identifier, command_and_payload = message.split(self._command_splitter, 1)
 
@@ -132,9 +157,15 @@ class _CommandHandler:
 
     _handler_registry: Dict[str, COMMAND_HANDLER_TYPE]
 
-    def __init__(self, mw: "AnkiQt", config: "ConfigManager"):
+    def __init__(
+        self,
+        mw: "AnkiQt",
+        config: "ConfigManager",
+        data_provider: Optional[DATA_PROVIDER_TYPE] = None,
+    ):
         self._mw: "AnkiQt" = mw
         self._config: ConfigManager = config
+        self._data_provider: Optional[DATA_PROVIDER_TYPE] = data_provider
 
     def __call__(
         self,
@@ -156,6 +187,22 @@ class _CommandHandler:
         browser.form.searchEdit.lineEdit().setText(search)
         browser.onSearchActivated()
 
+    @_register_command_handler("data")
+    def data(
+        self, payload: str, context: SUPPORTED_CONTEXT_TYPES
+    ) -> Optional[Dict[str, Any]]:
+        if not self._data_provider:
+            return None
+        request = json.loads(payload)
+        return self._data_provider(
+            HeatmapView[request["view"]],
+            request["limhist"],
+            request["limfcst"],
+            request["current_deck_only"],
+            request.get("start"),
+            request.get("stop"),
+        )
+
     @_register_command_handler("opts")
     def opts(self, payload: None, context: SUPPORTED_CONTEXT_TYPES) -> None:
         parent = self._get_context_parent(context)
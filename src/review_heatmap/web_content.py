@@ -33,7 +33,7 @@
 Static web components and templates
 """
 
-from .libaddon.platform import MODULE_ADDON, PLATFORM
+from .environment import MODULE_ADDON, PLATFORM
 
 CSS_DISABLE_HEATMAP = "rh-disable-heatmap"
 CSS_DISABLE_STATS = "rh-disable-stats"
@@ -88,8 +88,7 @@ HTML_HEATMAP: str = f"""
     <div id="cal-heatmap"></div>
 </div>
 <script type="text/javascript">
-    window.reviewHeatmap = new ReviewHeatmap({{options}});
-    reviewHeatmap.create({{data}});
+    ReviewHeatmap.load({{request}});
 </script>
 """
 
@@ -110,6 +109,10 @@ HTML_STREAK: str = """
 </div>
 """
 
+HTML_PLACEHOLDER: str = """
+<div id="{id}" class="rh-placeholder">Loading review activity…</div>
+"""
+
 HTML_INFO_NODATA: str = """
 No activity data to show (<span class="linkspan" onclick='pycmd("revhm_opts");'>options</span>).
 """
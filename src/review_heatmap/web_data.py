@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Compact wire format for activity data sent to the web view
+
+Instead of a mapping of epoch-second strings to counts, activity is sent as
+two run-length encoded day sequences, one for the review history and one
+for the forecast:
+
+    [first_day, count, count, -gap, count, ...]
+
+first_day is the day number since the unix epoch (UTC day start / 86400),
+each positive value is the count of one day, and each negative value skips
+over that many days without activity. Forecast counts are stored as
+magnitudes and negated by the decoder.
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+WIRE_FORMAT_VERSION = 1
+
+_DAY = 86400
+
+
+def encode_activity(activity: Dict[int, int]) -> Dict[str, Any]:
+    """
+    activity: day timestamps (seconds) -> counts, forecast counts negative
+    """
+    history = sorted((day, count) for day, count in activity.items() if count > 0)
+    forecast = sorted((day, -count) for day, count in activity.items() if count < 0)
+    return {
+        "version": WIRE_FORMAT_VERSION,
+        "history": _encode_runs(history),
+        "forecast": _encode_runs(forecast),
+    }
+
+
+class ActivityIndex:
+    """
+    Day-sorted view of activity data, serving encoded pages of arbitrary
+    date ranges without scanning the entire history
+    """
+
+    def __init__(self, activity: Dict[int, int]):
+        self._activity: Dict[int, int] = activity
+        self._days: List[int] = sorted(activity)
+
+    def encode(
+        self, start: Optional[int] = None, stop: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        start, stop: day timestamps in seconds (start inclusive, stop
+        exclusive). Set to None for unlimited.
+        """
+        days = self._days
+        low = bisect_left(days, start) if start is not None else 0
+        high = bisect_left(days, stop) if stop is not None else len(days)
+        activity = self._activity
+        return encode_activity({day: activity[day] for day in days[low:high]})
+
+
+def decode_activity(encoded: Dict[str, Any]) -> Dict[int, int]:
+    """
+    Inverse of encode_activity. Mirrors the decoder in ReviewHeatmap.
+    """
+    activity: Dict[int, int] = {}
+    _decode_runs(encoded["forecast"], -1, activity)
+    _decode_runs(encoded["history"], 1, activity)
+    return activity
+
+
+def _encode_runs(days: Iterable[Tuple[int, int]]) -> List[int]:
+    runs: List[int] = []
+    previous = None
+    for day, count in days:
+        index = day // _DAY
+        if previous is None:
+            runs.append(index)
+        elif index - previous > 1:
+            runs.append(previous + 1 - index)
+        runs.append(count)
+        previous = index
+    return runs
+
+
+def _decode_runs(runs: List[int], sign: int, activity: Dict[int, int]):
+    if not runs:
+        return
+    index = runs[0]
+    for value in runs[1:]:
+        if value < 0:
+            index -= value
+            continue
+        activity[index * _DAY] = sign * value
+        index += 1
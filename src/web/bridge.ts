@@ -31,7 +31,36 @@
 # Any modifications to this file must keep this entire header intact.
 */
 
-export function bridgeCommand(command: string): any {
+type BridgeCallback = (response: any) => void;
+
+// AnkiWebView only defines pycmd once its web channel is set up after the
+// document has loaded, so commands sent while the page is still being parsed
+// (e.g. from inline scripts) are queued until then
+const pendingCommands: [string, BridgeCallback | undefined][] = [];
+
+function bridgeReady(): boolean {
+  // @ts-expect-error
+  return typeof pycmd === "function";
+}
+
+function flushPendingCommands() {
+  if (!bridgeReady()) {
+    setTimeout(flushPendingCommands, 10);
+    return;
+  }
+  for (const [command, callback] of pendingCommands.splice(0)) {
+    // @ts-expect-error
+    pycmd(command, callback);
+  }
+}
+
+export function bridgeCommand(command: string, callback?: BridgeCallback): any {
+  if (pendingCommands.length || !bridgeReady()) {
+    if (pendingCommands.push([command, callback]) === 1) {
+      setTimeout(flushPendingCommands, 10);
+    }
+    return false;
+  }
   // @ts-expect-error
-  return pycmd(command);
+  return pycmd(command, callback);
 }
@@ -33,7 +33,13 @@ import "./_vendor/cal-heatmap.css";
 import "./css/review-heatmap.css";
 
 import { CalHeatMap } from "./_vendor/cal-heatmap.js";
-import { ReviewHeatmapOptions, ReviewHeatmapData } from "./types";
+import {
+  ReviewHeatmapOptions,
+  ReviewHeatmapData,
+  ReviewHeatmapEncodedData,
+  ReviewHeatmapRequest,
+  ReviewHeatmapResponse,
+} from "./types";
 import { bridgeCommand } from "./bridge";
 
 interface CalHeatmapFormatData {
@@ -50,9 +56,70 @@ interface CalHeatmapCellData {
 
 class ReviewHeatmap {
   private heatmap: CalHeatMap | null;
-
-  constructor(private options: ReviewHeatmapOptions) {
+  private data: ReviewHeatmapData;
+  // range of loaded activity data (UTC day timestamps in seconds, stop
+  // exclusive). Further pages are requested on navigation.
+  private loaded: [number, number] | null;
+
+  constructor(
+    private options: ReviewHeatmapOptions,
+    private request: ReviewHeatmapRequest | null = null
+  ) {
     this.heatmap = null;
+    this.data = {};
+    this.loaded = null;
+  }
+
+  // Request options and activity data from Python, then draw the heatmap
+  public static load(request: ReviewHeatmapRequest) {
+    bridgeCommand(
+      "revhm_data:" + JSON.stringify(request),
+      (response: ReviewHeatmapResponse | null) => {
+        if (!response) {
+          return;
+        }
+        let reviewHeatmap = new ReviewHeatmap(
+          response.options as ReviewHeatmapOptions,
+          request
+        );
+        globalThis.reviewHeatmap = reviewHeatmap;
+        reviewHeatmap.loaded = response.loaded;
+        reviewHeatmap.create(ReviewHeatmap.decode(response.data));
+      }
+    );
+  }
+
+  public static decode(encoded: ReviewHeatmapEncodedData): ReviewHeatmapData {
+    let data: ReviewHeatmapData = {};
+    decodeRuns(encoded.forecast, -1, data);
+    decodeRuns(encoded.history, 1, data);
+    return data;
+  }
+
+  // Swap a placeholder container for heatmap HTML rendered in the background
+  public static inject(placeholderId: string, html: string) {
+    let placeholder = document.getElementById(placeholderId);
+    let oldContainer = placeholder?.closest(".rh-container");
+    if (!oldContainer) {
+      // view was re-rendered in the meantime
+      return;
+    }
+
+    let template = document.createElement("template");
+    template.innerHTML = html;
+    let newContainer = template.content.querySelector(".rh-container");
+    if (!newContainer) {
+      return;
+    }
+
+    oldContainer.replaceWith(newContainer);
+
+    // scripts inserted via innerHTML are inert, so re-create them
+    newContainer.querySelectorAll("script").forEach((oldScript) => {
+      let script = document.createElement("script");
+      script.text = oldScript.text;
+      oldScript.replaceWith(script);
+    });
   }
 
   public create(data: ReviewHeatmapData) {
@@ -211,6 +278,11 @@ class ReviewHeatmap {
       data: data,
     });
 
+    // cal-heatmap drops empty data objects when merging options, so make sure
+    // it keeps reading from ours as more pages are loaded
+    heatmap.options.data = data;
+
+    this.data = data;
     this.heatmap = heatmap;
   }
 
@@ -227,19 +299,89 @@ class ReviewHeatmap {
     button,
     direction: "next" | "prev"
   ) {
+    let heatmap = this.heatmap;
+    let range = heatmap.options.range;
+    let navigate: () => void;
+    let start: Date;
+    let stop: Date;
+
     if (direction === "next") {
+      start = heatmap.getNextDomain(1);
       if (event.shiftKey) {
-        this.heatmap.jumpTo(this.heatmap.options.maxDate, false); // shift-click to jump to limit
+        // shift-click to jump to limit (padded to cover its whole domain)
+        stop = new Date(heatmap.options.maxDate);
+        stop.setFullYear(stop.getFullYear() + 1);
+        navigate = () => heatmap.jumpTo(heatmap.options.maxDate, false);
       } else {
-        this.heatmap.next(this.heatmap.options.range);
+        stop = heatmap.getNextDomain(range + 1);
+        navigate = () => heatmap.next(range);
       }
     } else {
+      stop = new Date(heatmap.getDomainKeys()[0]);
       if (event.shiftKey) {
-        this.heatmap.jumpTo(this.heatmap.options.minDate, false); // shift-click to jump to limit
+        // shift-click to jump to limit
+        start = heatmap.options.minDate;
+        navigate = () => heatmap.jumpTo(heatmap.options.minDate, false);
       } else {
-        this.heatmap.previous(this.heatmap.options.range);
+        start = heatmap.getPreviousDomain(range);
+        navigate = () => heatmap.previous(range);
       }
     }
+
+    // make sure the domains we are about to show are loaded, then prefetch
+    // the next page in each direction
+    this.ensureLoaded(dayKey(start), dayKey(stop), () => {
+      navigate();
+      this.ensureLoaded(
+        dayKey(heatmap.getPreviousDomain(range)),
+        dayKey(heatmap.getNextDomain(range + 1))
+      );
+    });
+  }
+
+  // Request activity data in [start, stop) that has not been loaded yet
+  private ensureLoaded(start: number, stop: number, callback?: () => void) {
+    if (!this.loaded || !this.request) {
+      // all data was supplied upfront
+      callback?.();
+      return;
+    }
+
+    let [loadedStart, loadedStop] = this.loaded;
+    let missing: [number, number][] = [];
+    if (start < loadedStart) {
+      missing.push([start, loadedStart]);
+    }
+    if (stop > loadedStop) {
+      missing.push([loadedStop, stop]);
+    }
+    if (!missing.length) {
+      callback?.();
+      return;
+    }
+
+    let pending = missing.length;
+    for (let [pageStart, pageStop] of missing) {
+      let request = { ...this.request, start: pageStart, stop: pageStop };
+      bridgeCommand(
+        "revhm_data:" + JSON.stringify(request),
+        (response: ReviewHeatmapResponse | null) => {
+          if (response) {
+            // cal-heatmap reads from the data object whenever it draws
+            // new domains
+            Object.assign(this.data, ReviewHeatmap.decode(response.data));
+            this.loaded = [
+              Math.min(this.loaded[0], response.loaded[0]),
+              Math.max(this.loaded[1], response.loaded[1]),
+            ];
+          }
+          pending--;
+          if (!pending) {
+            callback?.();
+          }
+        }
+      );
+    }
   }
 
   public onHmOpts(event: KeyboardEvent, button) {
@@ -265,6 +407,30 @@ function applyDateOffset(date: Date): Date {
   return new Date(date.getTime() + date.getTimezoneOffset() * 60 * 1000);
 }
 
+// return UTC day timestamp in seconds of a "zero"-ed local datetime
+function dayKey(date: Date): number {
+  return (
+    Date.UTC(date.getFullYear(), date.getMonth(), date.getDate()) / 1000
+  );
+}
+
+// expand run-length encoded day counts into timestamp -> count entries
+function decodeRuns(runs: number[], sign: number, data: ReviewHeatmapData) {
+  if (!runs.length) {
+    return;
+  }
+  let day = runs[0];
+  for (let i = 1; i < runs.length; i++) {
+    let value = runs[i];
+    if (value < 0) {
+      day -= value;
+      continue;
+    }
+    data[day * 86400] = sign * value;
+    day++;
+  }
+}
+
 // return local timezone offset in seconds at given unix timestamp
 function tzOffsetByTimestamp(timestamp: number): number {
   let date = new Date(timestamp * 1000);
@@ -42,4 +42,29 @@ export interface ReviewHeatmapOptions {
   whole: boolean;
 }
 
-export type ReviewHeatmapData = { [timestamp: number]: [cards: number] };
+export type ReviewHeatmapData = { [timestamp: number]: number };
+
+// Run-length encoded days: [firstDay, count, ..., -gap, count, ...]
+// (cf. web_data.py)
+export interface ReviewHeatmapEncodedData {
+  version: number;
+  history: number[];
+  forecast: number[];
+}
+
+export interface ReviewHeatmapRequest {
+  view: "deckbrowser" | "overview" | "stats";
+  limhist: number | null;
+  limfcst: number | null;
+  current_deck_only: boolean;
+  // requested page of activity data (UTC day timestamps in seconds, stop
+  // exclusive). Initial request leaves these out.
+  start?: number;
+  stop?: number;
+}
+
+export interface ReviewHeatmapResponse {
+  options?: ReviewHeatmapOptions;
+  data: ReviewHeatmapEncodedData;
+  loaded: [number, number] | null;
+}
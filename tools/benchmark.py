@@ -0,0 +1,425 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Benchmark report generation and rendering against synthetic collections
+
+Usage: python tools/benchmark.py [--sizes 10k,100k,1m,10m] [--repeats 5]
+       [--baseline PATH] [--save] [--tolerance 0.25] [--indexes]
+
+Times ActivityReporter.get_report (history query, forecast query, and stats
+separately) and HeatmapRenderer.render for every combination of the limdecks,
+limcdel, limresched, and current_deck_only settings, and counts the database
+statements issued per report. Collections are created
+through generate_collection.py on first use and kept in the fixtures folder.
+
+With --save, results are written to the baseline file. Otherwise they are
+compared against it, and the run fails if any scenario got slower than the
+baseline by more than the given tolerance.
+
+With --indexes, the add-on's optional indexes are created in the fixtures
+first (and dropped again on runs without it), and results are kept apart
+from those without indexes.
+
+With --query-plans, the statements behind each scenario's reports are
+audited instead, printing their query plans and flagging full table scans.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from generate_collection import PRESETS, generate_collection  # noqa: E402
+
+from review_heatmap.activity import ActivityReporter  # noqa: E402
+from review_heatmap.audit import audit_report_queries, format_plans  # noqa: E402
+from review_heatmap.headless import (  # noqa: E402
+    HeadlessCollection,
+    HeadlessDB,
+    headless_config,
+)
+from review_heatmap.indexes import IndexManager, format_size  # noqa: E402
+from review_heatmap.instrumentation import instrumentation  # noqa: E402
+from review_heatmap.renderer import HeatmapRenderer, HeatmapView  # noqa: E402
+
+BASELINE_VERSION = 1
+
+# metric -> instrumentation phases it is made up of
+_PHASE_METRICS: Dict[str, Tuple[str, ...]] = {
+    "history": ("history query",),
+    "forecast": ("forecast query",),
+    "stats": ("slicing", "stats"),
+}
+
+_METRICS: Tuple[str, ...] = (*_PHASE_METRICS, "report", "render", "queries")
+
+Results = Dict[str, Dict[str, float]]
+
+
+class Scenario(NamedTuple):
+    size: str
+    limdecks: bool  # exclude a deck tree
+    limcdel: bool
+    limresched: bool
+    current_deck_only: bool
+    indexes: bool = False  # add-on indexes in place
+
+    @property
+    def name(self) -> str:
+        name = "{} limdecks={:d} limcdel={:d} limresched={:d} cdo={:d}".format(
+            self.size,
+            self.limdecks,
+            self.limcdel,
+            self.limresched,
+            self.current_deck_only,
+        )
+        return name + " indexes=1" if self.indexes else name
+
+
+class StatementCounter:
+    """
+    Database wrapper counting the statements issued through it
+    """
+
+    _methods = ("all", "first", "scalar", "list", "execute")
+
+    def __init__(self, db):
+        self.db = db
+        self.count: int = 0
+
+    def __getattr__(self, name: str):
+        attr = getattr(self.db, name)
+        if name not in self._methods:
+            return attr
+
+        def counted(*args, **kwargs):
+            self.count += 1
+            return attr(*args, **kwargs)
+
+        return counted
+
+
+class Regression(NamedTuple):
+    scenario: str
+    metric: str
+    baseline: float
+    current: float
+
+
+def scenarios(sizes: List[str], indexes: bool = False) -> List[Scenario]:
+    return [
+        Scenario(size, *flags, indexes=indexes)
+        for size in sizes
+        for flags in itertools.product((False, True), repeat=4)
+    ]
+
+
+def fixture_path(fixtures: str, size: str, seed: int) -> str:
+    path = os.path.join(fixtures, f"{size}-seed{seed}.anki2")
+    if not os.path.exists(path):
+        os.makedirs(fixtures, exist_ok=True)
+        print(f"Generating {size} collection at {path}...", file=sys.stderr)
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.remove(partial)
+        generate_collection(partial, *PRESETS[size], seed=seed)
+        os.replace(partial, path)
+    return path
+
+
+def prepare_indexes(path: str, indexes: bool):
+    db = HeadlessDB(path, readonly=False)
+    try:
+        manager = IndexManager(db)
+        if indexes and manager.missing():
+            size = manager.create()
+            print(f"Created indexes in {path} ({format_size(size)})", file=sys.stderr)
+        elif not indexes and manager.present():
+            manager.drop()
+    finally:
+        db.close()
+
+
+def excluded_deck(col: HeadlessCollection) -> int:
+    """
+    Largest top-level deck tree outside of the current deck's tree
+    """
+    current = col.decks.name_if_exists(col.decks.get_current_id()) or ""
+    current_root = current.split("::")[0]
+    candidates = [
+        deck["id"]
+        for deck in col.decks.all()
+        if "::" not in deck["name"] and deck["name"] != current_root
+    ]
+    return max(candidates, key=lambda did: len(col.decks.children(did)))
+
+
+def scenario_config(col: HeadlessCollection, scenario: Scenario):
+    return headless_config(
+        limdecks=[excluded_deck(col)] if scenario.limdecks else [],
+        limcdel=scenario.limcdel,
+        limresched=scenario.limresched,
+    )
+
+
+def run_scenario(
+    col: HeadlessCollection, scenario: Scenario, repeats: int
+) -> Dict[str, float]:
+    config = scenario_config(col, scenario)
+    view = (
+        HeatmapView.overview if scenario.current_deck_only else HeatmapView.deckbrowser
+    )
+    mw = SimpleNamespace(col=col)
+
+    samples: Dict[str, List[float]] = {metric: [] for metric in _METRICS}
+
+    for _ in range(repeats):
+        # fresh reporters, so that every run starts out without cached data
+        counter = StatementCounter(col.db)
+        col.db = counter  # type: ignore[assignment]
+        try:
+            reporter = ActivityReporter(col, config)
+            start = time.perf_counter()
+            reporter.get_report(current_deck_only=scenario.current_deck_only)
+            samples["report"].append(time.perf_counter() - start)
+        finally:
+            col.db = counter.db
+        samples["queries"].append(counter.count)
+
+        instrumentation.clear()
+        renderer = HeatmapRenderer(
+            mw, ActivityReporter(col, config), config  # type: ignore[arg-type]
+        )
+        with instrumentation.trace(scenario.name):
+            renderer.render(view, current_deck_only=scenario.current_deck_only)
+        (trace,) = instrumentation.traces()
+
+        samples["render"].append(trace.duration)
+        for metric, phase_names in _PHASE_METRICS.items():
+            samples[metric].append(
+                sum(p.duration for p in trace.phases if p.name in phase_names)
+            )
+
+    return {
+        metric: (
+            statistics.median(values)
+            if metric == "queries"
+            else round(statistics.median(values) * 1000, 3)
+        )
+        for metric, values in samples.items()
+    }
+
+
+def compare(
+    results: Results,
+    baseline: Results,
+    tolerance: float,
+    min_delta: float,
+) -> List[Regression]:
+    """
+    min_delta: absolute slowdown in ms below which differences are
+    attributed to noise
+
+    Statement counts are deterministic, so any increase counts as a
+    regression.
+    """
+    regressions = []
+    for scenario, metrics in results.items():
+        for metric, current in metrics.items():
+            reference = baseline.get(scenario, {}).get(metric)
+            if reference is None:
+                continue
+            if metric == "queries":
+                regressed = current > reference
+            else:
+                regressed = current > reference * (1 + tolerance) and (
+                    current - reference > min_delta
+                )
+            if regressed:
+                regressions.append(Regression(scenario, metric, reference, current))
+    return regressions
+
+
+def environment() -> Dict[str, str]:
+    try:
+        import numpy
+
+        numpy_version = numpy.__version__
+    except ImportError:
+        numpy_version = "not installed"
+    return {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "numpy": numpy_version,
+        "machine": platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--sizes",
+        default="10k,100k,1m",
+        help="comma-separated collection presets ({})".format(", ".join(PRESETS)),
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--fixtures",
+        default=os.path.join(tempfile.gettempdir(), "review_heatmap_benchmarks"),
+        help="folder generated collections are kept in",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=os.path.join(os.path.dirname(__file__), "benchmark_baseline.json"),
+    )
+    parser.add_argument(
+        "--save", action="store_true", help="write results to the baseline file"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="allowed slowdown relative to the baseline (default: 0.25)",
+    )
+    parser.add_argument(
+        "--query-plans",
+        action="store_true",
+        help="print the query plans of all statements instead of timing them",
+    )
+    parser.add_argument(
+        "--indexes",
+        action="store_true",
+        help="run with the add-on's optional indexes in place",
+    )
+    parser.add_argument(
+        "--min-delta",
+        type=float,
+        default=1.0,
+        help="slowdowns below this many ms are never reported (default: 1.0)",
+    )
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(",")
+    unknown = set(sizes) - set(PRESETS)
+    if unknown:
+        parser.error("unknown sizes: {}".format(", ".join(sorted(unknown))))
+
+    if args.query_plans:
+        for size in sizes:
+            path = fixture_path(args.fixtures, size, args.seed)
+            prepare_indexes(path, args.indexes)
+            with HeadlessCollection(path) as col:
+                configs = [
+                    scenario_config(col, scenario)
+                    for scenario in scenarios([size])
+                    if not scenario.current_deck_only  # covered by each report run
+                ]
+                print(f"# {size}\n")
+                print(format_plans(audit_report_queries(col, configs)))  # type: ignore
+                print()
+        return
+
+    baseline: Optional[Results] = None
+    if not args.save:
+        if not os.path.exists(args.baseline):
+            parser.error(f"no baseline at {args.baseline}, create one with --save")
+        with open(args.baseline) as f:
+            data = json.load(f)
+        if data.get("version") != BASELINE_VERSION:
+            parser.error("baseline was created by an incompatible version")
+        baseline = data["results"]
+
+    instrumentation.set_enabled(True)
+    print(f"{'scenario':<68}" + "".join(f"{metric:>10}" for metric in _METRICS))
+
+    results: Results = {}
+    for size in sizes:
+        path = fixture_path(args.fixtures, size, args.seed)
+        prepare_indexes(path, args.indexes)
+        with HeadlessCollection(path) as col:
+            for scenario in scenarios([size], indexes=args.indexes):
+                result = run_scenario(col, scenario, args.repeats)
+                results[scenario.name] = result
+                print(
+                    f"{scenario.name:<68}"
+                    + "".join(f"{result[metric]:>10.1f}" for metric in _METRICS)
+                )
+
+    if baseline is None:
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                data = json.load(f)
+            if data.get("version") == BASELINE_VERSION:
+                # keep results of sizes that were not part of this run
+                results = {**data["results"], **results}
+        with open(args.baseline, "w") as f:
+            json.dump(
+                {
+                    "version": BASELINE_VERSION,
+                    "environment": environment(),
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Saved baseline to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if not regressions:
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+        return
+
+    print(f"\n{len(regressions)} regressions beyond {args.tolerance:.0%}:")
+    for regression in regressions:
+        unit = "" if regression.metric == "queries" else " ms"
+        print(
+            f"  {regression.scenario} {regression.metric}: "
+            f"{regression.baseline:.1f}{unit} -> {regression.current:.1f}{unit}"
+        )
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
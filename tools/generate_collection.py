@@ -0,0 +1,440 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Generate synthetic Anki collections of configurable size for benchmarking
+
+Usage: python tools/generate_collection.py OUTPUT [--preset 1m] [--seed 0]
+       [--revlog N] [--years Y] [--cards M] [--decks D]
+
+Writes a schema 11 collection file with a nested deck tree, cards in all
+scheduling queues, and a review history modelled on real usage: alternating
+phases of regular study and lapses, occasional long breaks, uneven daily
+counts, and a mix of learning, review, relearning, filtered, and rescheduled
+(ease 0) entries, a share of which belongs to deleted cards.
+
+Output is reproducible for a given seed and generation day. Notes and note
+types are left empty, so the files are meant for headless report tooling
+(cf. review_heatmap.headless), not for opening in Anki.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+_DAY = 86400
+_ROLLOVER = 4
+_CHUNK_SIZE = 100_000
+
+_SCHEMA = """
+CREATE TABLE col (
+    id integer PRIMARY KEY, crt integer NOT NULL, mod integer NOT NULL,
+    scm integer NOT NULL, ver integer NOT NULL, dty integer NOT NULL,
+    usn integer NOT NULL, ls integer NOT NULL, conf text NOT NULL,
+    models text NOT NULL, decks text NOT NULL, dconf text NOT NULL,
+    tags text NOT NULL
+);
+CREATE TABLE notes (
+    id integer PRIMARY KEY, guid text NOT NULL, mid integer NOT NULL,
+    mod integer NOT NULL, usn integer NOT NULL, tags text NOT NULL,
+    flds text NOT NULL, sfld integer NOT NULL, csum integer NOT NULL,
+    flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE cards (
+    id integer PRIMARY KEY, nid integer NOT NULL, did integer NOT NULL,
+    ord integer NOT NULL, mod integer NOT NULL, usn integer NOT NULL,
+    type integer NOT NULL, queue integer NOT NULL, due integer NOT NULL,
+    ivl integer NOT NULL, factor integer NOT NULL, reps integer NOT NULL,
+    lapses integer NOT NULL, left integer NOT NULL, odue integer NOT NULL,
+    odid integer NOT NULL, flags integer NOT NULL, data text NOT NULL
+);
+CREATE TABLE revlog (
+    id integer PRIMARY KEY, cid integer NOT NULL, usn integer NOT NULL,
+    ease integer NOT NULL, ivl integer NOT NULL, lastIvl integer NOT NULL,
+    factor integer NOT NULL, time integer NOT NULL, type integer NOT NULL
+);
+CREATE TABLE graves (
+    usn integer NOT NULL, oid integer NOT NULL, type integer NOT NULL
+);
+"""
+
+# created after bulk inserts, matching Anki's schema 11 indices
+_INDICES = """
+CREATE INDEX ix_notes_usn ON notes (usn);
+CREATE INDEX ix_cards_usn ON cards (usn);
+CREATE INDEX ix_revlog_usn ON revlog (usn);
+CREATE INDEX ix_cards_nid ON cards (nid);
+CREATE INDEX ix_cards_sched ON cards (did, queue, due);
+CREATE INDEX ix_revlog_cid ON revlog (cid);
+CREATE INDEX ix_notes_csum ON notes (csum);
+"""
+
+
+class Preset(NamedTuple):
+    revlog: int  # number of revlog rows
+    years: float  # span of the review history
+    cards: int
+    decks: int
+
+
+PRESETS: Dict[str, Preset] = {
+    "10k": Preset(revlog=10_000, years=1, cards=2_000, decks=8),
+    "100k": Preset(revlog=100_000, years=3, cards=10_000, decks=25),
+    "1m": Preset(revlog=1_000_000, years=8, cards=60_000, decks=80),
+    "10m": Preset(revlog=10_000_000, years=20, cards=400_000, decks=250),
+}
+
+# revlog type, ease choices, share of graded entries
+_ENTRY_KINDS: Tuple[Tuple[int, Tuple[int, ...], float], ...] = (
+    (0, (1, 3, 3, 3, 4), 0.12),  # learning
+    (1, (1, 2, 3, 3, 3, 3, 3, 4), 0.76),  # review
+    (2, (1, 3, 3), 0.08),  # relearning
+    (3, (1, 3, 3, 4), 0.04),  # filtered deck
+)
+
+# queue, share of cards
+_CARD_QUEUES: Tuple[Tuple[int, float], ...] = (
+    (0, 0.20),  # new
+    (1, 0.02),  # learning
+    (2, 0.63),  # review
+    (3, 0.02),  # day learning
+    (-1, 0.10),  # suspended
+    (-2, 0.03),  # buried
+)
+
+
+def generate_collection(
+    path: str,
+    revlog: int,
+    years: float,
+    cards: int,
+    decks: int,
+    seed: int = 0,
+    rescheduled: float = 0.03,
+    deleted: float = 0.02,
+    now: Optional[float] = None,
+):
+    """
+    rescheduled: share of revlog entries logged by manual rescheduling
+    deleted: share of revlog entries belonging to deleted cards
+    now: unix timestamp the history leads up to, defaults to the current time
+    """
+    if os.path.exists(path):
+        raise FileExistsError(path)
+
+    rng = random.Random(seed)
+    now = time.time() if now is None else now
+    days = max(1, int(years * 365))
+
+    today_start = _local_day_start(now)
+    crt = int(today_start - (days + 30) * _DAY)
+    sched_today = int((now - _local_day_start(crt)) // _DAY)
+
+    deck_names = _deck_tree(rng, decks)
+    card_ids = _card_ids(crt, cards)
+
+    db = sqlite3.connect(path)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(_SCHEMA)
+        db.execute(
+            "INSERT INTO col VALUES (1, ?, ?, ?, 11, 0, 0, 0, ?, '{}', ?, '{}', '{}')",
+            (
+                crt,
+                int(now * 1000),
+                int(now * 1000),
+                json.dumps(_collection_conf(deck_names)),
+                json.dumps(
+                    {
+                        str(did): {"id": did, "name": name, "dyn": 0}
+                        for did, name in deck_names.items()
+                    }
+                ),
+            ),
+        )
+        _insert_chunked(
+            db,
+            "INSERT INTO cards VALUES "
+            "(?, ?, ?, 0, ?, 0, ?, ?, ?, ?, ?, ?, ?, 0, 0, 0, 0, '')",
+            _cards(rng, card_ids, list(deck_names), sched_today),
+        )
+        _insert_chunked(
+            db,
+            "INSERT INTO revlog VALUES (?, ?, 0, ?, ?, ?, ?, ?, ?)",
+            _revlog(
+                rng,
+                _daily_counts(rng, days, revlog),
+                today_start,
+                now,
+                card_ids,
+                rescheduled,
+                deleted,
+            ),
+        )
+        db.executescript(_INDICES)
+        db.commit()
+        db.execute("ANALYZE")
+    finally:
+        db.close()
+
+
+# Collection structure
+#########################################################################
+
+
+def _local_day_start(timestamp: float) -> float:
+    """
+    Local start of the scheduling day (i.e. including the rollover hour)
+    the given timestamp falls into
+    """
+    moment = datetime.datetime.fromtimestamp(timestamp)
+    start = moment.replace(hour=_ROLLOVER, minute=0, second=0, microsecond=0)
+    if start > moment:
+        start -= datetime.timedelta(days=1)
+    return time.mktime(start.timetuple())
+
+
+def _deck_tree(rng: random.Random, count: int) -> Dict[int, str]:
+    """
+    Nested deck tree of up to four levels, Default deck included
+    """
+    names = {1: "Default"}
+    depths = {1: 0}
+    top_level: List[int] = []
+    for did in range(2, count + 2):
+        parents = [d for d in top_level if depths[d] < 3]
+        if not parents or rng.random() < 0.25:
+            names[did] = f"Deck {did}"
+            depths[did] = 0
+        else:
+            parent = rng.choice(parents)
+            names[did] = f"{names[parent]}::Deck {did}"
+            depths[did] = depths[parent] + 1
+        top_level.append(did)
+    return names
+
+
+def _collection_conf(deck_names: Dict[int, str]) -> Dict[str, object]:
+    # select a deck with subdecks, so that current deck reports are nested
+    parents = {name.rsplit("::", 1)[0] for name in deck_names.values()}
+    current = next(
+        (did for did, name in deck_names.items() if name in parents and did != 1),
+        1,
+    )
+    return {
+        "rollover": _ROLLOVER,
+        "schedVer": 2,
+        "sched2021": True,
+        "curDeck": current,
+        "activeDecks": [current],
+    }
+
+
+def _card_ids(crt: int, count: int) -> List[int]:
+    # card ids are creation timestamps in ms
+    return [crt * 1000 + index * 1000 for index in range(1, count + 1)]
+
+
+def _cards(
+    rng: random.Random, card_ids: List[int], deck_ids: List[int], sched_today: int
+) -> Iterator[Tuple[int, ...]]:
+    # uneven deck sizes, a few large decks and a long tail of small ones
+    weights = [1 / rank for rank in range(1, len(deck_ids) + 1)]
+    rng.shuffle(weights)
+    queues = [queue for queue, _ in _CARD_QUEUES]
+    queue_weights = [share for _, share in _CARD_QUEUES]
+
+    dids = rng.choices(deck_ids, weights, k=len(card_ids))
+    card_queues = rng.choices(queues, queue_weights, k=len(card_ids))
+
+    for position, (cid, did, queue) in enumerate(zip(card_ids, dids, card_queues)):
+        if queue == 0:
+            yield cid, cid, did, cid // 1000, 0, 0, position, 0, 0, 0, 0
+            continue
+        ivl = max(1, int(rng.lognormvariate(3, 1.2)))
+        reps = rng.randint(1, 30)
+        lapses = rng.randint(0, reps // 4)
+        if queue == 1:
+            # intraday learning cards are due at a timestamp
+            due = cid // 1000 + rng.randint(0, 3600)
+            yield cid, cid, did, cid // 1000, 1, 1, due, 0, 2500, reps, lapses
+            continue
+        due = sched_today + rng.randint(-min(ivl, 30), ivl)
+        card_type = 3 if queue == 3 else 2
+        factor = rng.randint(1300, 3000)
+        yield cid, cid, did, cid // 1000, card_type, queue, due, ivl, factor, reps, lapses
+
+
+# Review history
+#########################################################################
+
+
+def _daily_counts(rng: random.Random, days: int, total: int) -> List[int]:
+    """
+    Distribute total reviews over the given number of days, oldest first
+
+    Study alternates between engaged phases with near-daily activity and
+    lapsed phases with sporadic activity. Counts vary by phase intensity,
+    weekday, and day-to-day noise. The most recent phase is always engaged,
+    so that collections have an ongoing streak.
+    """
+    weights: List[float] = []
+    engaged = True
+    while len(weights) < days:
+        if engaged:
+            length = int(rng.expovariate(1 / 60)) + 1
+            active_share, intensity = 0.95, rng.uniform(0.5, 1.5)
+        elif rng.random() < 0.15:  # long break
+            length = int(rng.expovariate(1 / 45)) + 1
+            active_share, intensity = 0.0, 0.0
+        else:
+            length = int(rng.expovariate(1 / 8)) + 1
+            active_share, intensity = 0.2, rng.uniform(0.2, 0.6)
+        for _ in range(length):
+            if rng.random() < active_share:
+                weekday_factor = 0.7 if len(weights) % 7 in (5, 6) else 1.0
+                weights.append(intensity * weekday_factor * rng.lognormvariate(0, 0.5))
+            else:
+                weights.append(0.0)
+        engaged = not engaged
+
+    weights = weights[-days:]
+    tail = min(days, 14)
+    for index in range(days - tail, days):
+        weights[index] = weights[index] or rng.uniform(0.5, 1.5)
+
+    weight_sum = sum(weights)
+    counts = [int(total * weight / weight_sum) for weight in weights]
+    active = [index for index, weight in enumerate(weights) if weight]
+    for index in rng.choices(active, k=total - sum(counts)):
+        counts[index] += 1
+    return counts
+
+
+def _revlog(
+    rng: random.Random,
+    daily_counts: List[int],
+    today_start: float,
+    now: float,
+    card_ids: List[int],
+    rescheduled: float,
+    deleted: float,
+) -> Iterator[Tuple[int, ...]]:
+    kinds = [(kind, eases) for kind, eases, _ in _ENTRY_KINDS]
+    kind_weights = [share for _, _, share in _ENTRY_KINDS]
+    days = len(daily_counts)
+    # ids of deleted cards sort after all existing cards
+    deleted_ids = [card_ids[-1] + index * 1000 for index in range(1, 1001)]
+
+    for index, count in enumerate(daily_counts):
+        if not count:
+            continue
+        day_start = today_start - (days - 1 - index) * _DAY
+        # reviews logged between the rollover and 21:00 local time
+        window = int(17 * 3600 * 1000)
+        if index == days - 1:
+            window = max(count, min(window, int((now - day_start) * 1000)))
+        offsets = sorted(rng.sample(range(window), count))
+        entry_kinds = rng.choices(kinds, kind_weights, k=count)
+        for offset, (kind, eases) in zip(offsets, entry_kinds):
+            rid = int(day_start * 1000) + offset
+            cid = rng.choice(deleted_ids if rng.random() < deleted else card_ids)
+            if rng.random() < rescheduled:
+                # manual reschedules log ease 0
+                yield rid, cid, 0, rng.randint(1, 365), 0, 2500, 0, 4
+                continue
+            ease = rng.choice(eases)
+            ivl = -600 if kind != 1 and ease == 1 else rng.randint(1, 365)
+            last_ivl = rng.randint(0, 180)
+            answer_ms = rng.randint(1000, 60000)
+            yield rid, cid, ease, ivl, last_ivl, 2500, answer_ms, kind
+
+
+def _insert_chunked(db: sqlite3.Connection, sql: str, rows: Iterator[Tuple]):
+    chunk: List[Tuple] = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= _CHUNK_SIZE:
+            db.executemany(sql, chunk)
+            chunk.clear()
+    if chunk:
+        db.executemany(sql, chunk)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("output", help="path of the collection file to create")
+    parser.add_argument("--preset", choices=PRESETS, default="100k")
+    parser.add_argument("--revlog", type=int, help="number of revlog rows")
+    parser.add_argument("--years", type=float, help="span of the review history")
+    parser.add_argument("--cards", type=int, help="number of cards")
+    parser.add_argument("--decks", type=int, help="number of decks")
+    parser.add_argument("--rescheduled", type=float, default=0.03)
+    parser.add_argument("--deleted", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]._replace(
+        **{
+            field: getattr(args, field)
+            for field in Preset._fields
+            if getattr(args, field) is not None
+        }
+    )
+
+    start = time.perf_counter()
+    try:
+        generate_collection(
+            args.output,
+            *preset,
+            seed=args.seed,
+            rescheduled=args.rescheduled,
+            deleted=args.deleted,
+        )
+    except FileExistsError:
+        sys.exit(f"{args.output} already exists")
+
+    print(
+        f"Generated {preset.revlog} revlog entries over {preset.years} years, "
+        f"{preset.cards} cards in {preset.decks + 1} decks "
+        f"in {time.perf_counter() - start:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
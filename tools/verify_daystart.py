@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Check local_daystart against SQLite's localtime handling in every time zone
+
+Usage: python tools/verify_daystart.py [--zones Europe/Berlin,...]
+       [--samples 200] [--seed 0]
+
+For each zone of the system's tz database, compares times.local_daystart
+with the SQLite-based times.daystart_epoch right before, at, and after
+every UTC offset transition (i.e. DST changes) between 1971 and 2037, at
+the local midnights surrounding them, and at random times, with varying
+day rollover offsets. Exits with an error if any result differs.
+
+Zones are switched through the TZ environment variable, so this requires
+a POSIX system.
+"""
+
+import argparse
+import calendar
+import os
+import random
+import sys
+import time
+import zoneinfo
+from typing import Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from review_heatmap import times  # noqa: E402
+from review_heatmap.headless import HeadlessDB  # noqa: E402
+
+# SQLite maps years outside of this range onto equivalent years before
+# converting to local time (cf. local_daystart)
+_SPAN = (
+    calendar.timegm((1971, 1, 2, 0, 0, 0)),
+    calendar.timegm((2037, 12, 30, 0, 0, 0)),
+)
+_ROLLOVERS = (0, 4, 23)
+
+
+def sample_times(
+    transitions: Tuple[Tuple[int, int], ...], samples: int, rng: random.Random
+) -> Iterator[int]:
+    """
+    Timestamps (before applying the rollover offset) worth checking
+    """
+    for timestamp, utc_offset in transitions[1:]:
+        yield from (timestamp - 1, timestamp, timestamp + 1)
+        # local midnights of the days before and after the transition
+        local = timestamp + utc_offset
+        for midnight in (local - local % 86400, local - local % 86400 + 86400):
+            for delta in (-1, 0, 1):
+                yield midnight - utc_offset + delta
+    for _ in range(samples):
+        yield rng.randrange(*_SPAN)
+
+
+def verify_zone(
+    zone: str, db: HeadlessDB, samples: int, rng: random.Random
+) -> List[Tuple[int, int, int, int]]:
+    """
+    Returns:
+        [(timestamp, rollover, local_daystart, daystart_epoch)**]: mismatches
+    """
+    os.environ["TZ"] = zone
+    time.tzset()
+    # zones with identical names and offsets share a fingerprint
+    times._utc_day_offsets.cache_clear()
+
+    transitions = times._scan_utc_offset_transitions(*_SPAN)
+    mismatches = []
+    for index, shifted in enumerate(sample_times(transitions, samples, rng)):
+        rollover = _ROLLOVERS[index % len(_ROLLOVERS)]
+        timestamp = shifted + rollover * 3600
+        actual = times.local_daystart(timestamp, offset=rollover)
+        expected = times.daystart_epoch(
+            db, timestamp, offset=rollover  # type: ignore[arg-type]
+        )
+        if actual != expected:
+            mismatches.append((timestamp, rollover, actual, expected))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--zones", help="comma-separated zones to check (default: all zones)"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=200, help="random times to check per zone"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    zones = (
+        args.zones.split(",") if args.zones else sorted(zoneinfo.available_timezones())
+    )
+    rng = random.Random(args.seed)
+    db = HeadlessDB(":memory:", readonly=False)
+
+    failed = 0
+    for zone in zones:
+        mismatches = verify_zone(zone, db, args.samples, rng)
+        if not mismatches:
+            continue
+        failed += 1
+        print(f"{zone}: {len(mismatches)} mismatches")
+        for timestamp, rollover, actual, expected in mismatches[:5]:
+            print(
+                f"  {timestamp} (rollover {rollover}h): "
+                f"{actual} instead of {expected}"
+            )
+
+    print(f"Checked {len(zones)} zones, {failed} with mismatches")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
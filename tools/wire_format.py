@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+# Review Heatmap Add-on for Anki
+#
+# Copyright (C) 2016-2022  Aristotelis P. <https//glutanimate.com/>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License as
+# published by the Free Software Foundation, either version 3 of the
+# License, or (at your option) any later version, with the additions
+# listed at the end of the accompanied license file.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# NOTE: This program is subject to certain additional terms pursuant to
+# Section 7 of the GNU Affero General Public License.  You should have
+# received a copy of these additional terms immediately following the
+# terms and conditions of the GNU Affero General Public License which
+# accompanied this program.
+#
+# If not, please request a copy through one of the means of contact
+# listed here: <https://glutanimate.com/contact/>.
+#
+# Any modifications to this file must keep this entire header intact.
+
+"""
+Compare size and parse time of the legacy and compact activity wire formats
+
+Usage: python tools/wire_format.py [--years 20] [--seed 0]
+
+Generates a synthetic review history spanning the given number of years
+(plus a one-year forecast) and reports the serialized size of both formats,
+the time it takes to encode them in Python, as well as the time it takes to
+parse and decode them in Python and, if node is available, in JavaScript.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "src"))
+
+from review_heatmap.web_data import decode_activity, encode_activity  # noqa: E402
+
+_DAY = 86400
+
+# mirrors decodeRuns() in src/web/main.ts
+_JS_BENCHMARK = """
+const fs = require("fs");
+const [legacy, compact, repeats] = [
+  fs.readFileSync(process.argv[1], "utf8"),
+  fs.readFileSync(process.argv[2], "utf8"),
+  parseInt(process.argv[3]),
+];
+function decodeRuns(runs, sign, data) {
+  if (!runs.length) return;
+  let day = runs[0];
+  for (let i = 1; i < runs.length; i++) {
+    const value = runs[i];
+    if (value < 0) { day -= value; continue; }
+    data[day * 86400] = sign * value;
+    day++;
+  }
+}
+function time(fn) {
+  const start = process.hrtime.bigint();
+  for (let i = 0; i < repeats; i++) fn();
+  return Number(process.hrtime.bigint() - start) / 1e6 / repeats;
+}
+console.log(JSON.stringify({
+  legacy: time(() => JSON.parse(legacy)),
+  compact: time(() => {
+    const encoded = JSON.parse(compact);
+    const data = {};
+    decodeRuns(encoded.forecast, -1, data);
+    decodeRuns(encoded.history, 1, data);
+  }),
+}));
+"""
+
+
+def synthetic_activity(years: int, seed: int) -> Dict[int, int]:
+    rng = random.Random(seed)
+    today = int(time.time()) // _DAY * _DAY
+    activity: Dict[int, int] = {}
+    for index in range(years * 365, 0, -1):
+        # mostly daily activity with occasional breaks
+        if rng.random() < 0.85:
+            activity[today - index * _DAY] = rng.randint(1, 400)
+    activity[today] = rng.randint(1, 400)
+    for index in range(1, 366):
+        activity[today + index * _DAY] = -rng.randint(1, 400)
+    return activity
+
+
+def time_ms(function: Callable[[], object], repeats: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+
+    activity = synthetic_activity(args.years, args.seed)
+    legacy = json.dumps(activity)
+    compact = json.dumps(encode_activity(activity), separators=(",", ":"))
+
+    assert decode_activity(json.loads(compact)) == activity
+
+    print(f"{len(activity)} days of activity over {args.years} years")
+    print(
+        f"{'':<10}{'size (KB)':>12}{'py encode (ms)':>16}"
+        f"{'py parse (ms)':>16}{'js parse (ms)':>16}"
+    )
+
+    encode = {
+        "legacy": time_ms(lambda: json.dumps(activity), args.repeats),
+        "compact": time_ms(
+            lambda: json.dumps(encode_activity(activity), separators=(",", ":")),
+            args.repeats,
+        ),
+    }
+    parse = {
+        "legacy": time_ms(lambda: json.loads(legacy), args.repeats),
+        "compact": time_ms(lambda: decode_activity(json.loads(compact)), args.repeats),
+    }
+
+    js = {"legacy": float("nan"), "compact": float("nan")}
+    node = shutil.which("node")
+    if node:
+        paths = []
+        for name, payload in (("legacy", legacy), ("compact", compact)):
+            path = os.path.join(os.path.dirname(__file__), f".wire_{name}.json")
+            with open(path, "w") as f:
+                f.write(payload)
+            paths.append(path)
+        try:
+            output = subprocess.check_output(
+                [node, "-e", _JS_BENCHMARK, *paths, str(args.repeats)]
+            )
+            js = json.loads(output)
+        finally:
+            for path in paths:
+                os.remove(path)
+
+    for name, payload in (("legacy", legacy), ("compact", compact)):
+        print(
+            f"{name:<10}{len(payload) / 1024:>12.1f}{encode[name]:>16.3f}"
+            f"{parse[name]:>16.3f}{js[name]:>16.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()